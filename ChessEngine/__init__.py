@@ -0,0 +1,44 @@
+"""
+ChessEngine is the search engine behind the AI player. It searches positions
+held in a `Chessnut.Game`, making and taking back moves in place with
+`push()`/`pop()`, and returns the best move it finds together with its score
+and the principal variation (the line of best play it expects).
+
+To use ChessEngine, create a `Search` and give it a game and a depth:
+
+    from Chessnut import Game
+    from ChessEngine import Search
+
+    result = Search().search(Game(), depth=3)
+
+    result.move  # best move in simple algebraic notation, e.g., 'e2e4'
+
+    result.score  # centipawns from the point of view of the side to move
+
+    result.pv  # expected line of play, starting with result.move
+
+The search deepens iteratively, so it can also be given a time limit in
+seconds (e.g., from `time_budget()` and the time left on the clock), and
+returns the best move of the deepest iteration that finished in time:
+
+    result = Search().search(Game(), time_limit=time_budget(600, 5))
+
+`ParallelSearch` has the same `search()` method, and splits the root moves
+across a pool of worker processes.
+
+Both report the progress of each iteration (depth, nodes per second,
+transposition table use, principal variation, ...) as a `SearchInfo` to
+listeners added with `add_listener()`; `JsonLinesLog` is a listener that
+logs them to a file:
+
+    engine = Search()
+    engine.add_listener(lambda info: print(info.depth, info.nps, info.pv))
+"""
+
+# import module classes and promote into the package namespace
+from ChessEngine.search import Search, SearchInfo, SearchResult, time_budget
+from ChessEngine.evaluate import Evaluator, evaluate, evaluate_pst
+from ChessEngine.ordering import MoveOrderer
+from ChessEngine.parallel import ParallelSearch
+from ChessEngine.telemetry import JsonLinesLog
+from ChessEngine.tt import TranspositionTable, TTEntry
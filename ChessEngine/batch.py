@@ -0,0 +1,273 @@
+"""
+Vectorized evaluation of many positions at once with NumPy, for offline
+work such as game review, tuning and labelling datasets, where scoring each
+position through Python loops over the board is too slow.
+
+Positions (FEN strings, `Chessnut.Game` instances, Chessnut boards, or
+`ChessBoard` objects) are packed into an `(N, 64)` array of int8 piece codes
+(0 for an empty square, 1-12 for the symbols in PIECES), which can also be
+expanded into `(N, 12, 64)` one-hot piece planes:
+
+    from ChessEngine.batch import evaluate_batch, pack_positions, to_planes
+
+    scores = evaluate_batch(['<fen>', '<fen>', ...])
+
+    boards, players = pack_positions(['<fen>', ...])
+    planes = to_planes(boards)  # (N, 12, 64)
+    scores = evaluate_batch(planes, players)
+
+The score of each position is the material and piece-square evaluation
+(`ChessEngine.evaluate.evaluate_pst()`) plus the mobility term
+(`evaluate_mobility()`), from the point of view of the player to move, and
+agrees exactly with the scalar functions.
+
+NumPy is an optional dependency; it is only needed to use this module.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from Chessnut import moves as move_tables
+
+from ChessEngine.evaluate import (MG_TABLES, EG_TABLES, PHASES, MAX_PHASE,
+                                  MOBILITY_WEIGHTS)
+
+PIECES = 'PNBRQKpnbrqk'
+
+# Expands the digits of a FEN piece placement into runs of empty squares
+_EXPAND = {ord(str(num)): ' ' * num for num in range(1, 9)}
+_EXPAND[ord('/')] = None
+
+# Number of positions evaluated together; bounds the memory used by the
+# temporary (7, 64, 8, chunk) array of the squares along each ray
+CHUNK_SIZE = 4096
+
+# Index of an extra, always occupied, square used to pad short rays
+_PAD = 64
+
+_TABLES = None
+
+
+def _require_numpy():
+    """Raise ImportError if NumPy is not installed."""
+    if np is None:
+        raise ImportError("ChessEngine.batch requires NumPy "
+                          "(pip install numpy)")
+
+
+def _symbol_codes():
+    """
+    Return an array mapping the ASCII code of each piece symbol to its
+    piece code, and every other character to -1.
+    """
+    codes = np.full(128, -1, dtype=np.int8)
+    for code, sym in enumerate(' ' + PIECES):
+        codes[ord(sym)] = code
+    return codes
+
+
+def _tables():
+    """
+    Build the NumPy lookup tables from the scalar evaluation tables the
+    first time they are needed.
+    """
+    global _TABLES
+    if _TABLES is not None:
+        return _TABLES
+
+    symbols = ' ' + PIECES
+    mg = np.array([MG_TABLES[sym] for sym in symbols], dtype=np.int32)
+    eg = np.array([EG_TABLES[sym] for sym in symbols], dtype=np.int32)
+    phase = np.array([PHASES[sym] for sym in symbols], dtype=np.int32)
+
+    # signed mobility weights of each piece code for knight moves, and for
+    # diagonal and straight rays
+    knight = np.zeros(13, dtype=np.int32)
+    diagonal = np.zeros(13, dtype=np.int32)
+    straight = np.zeros(13, dtype=np.int32)
+    for code, sym in enumerate(symbols):
+        sign = 1 if sym.isupper() else -1
+        weight = sign * MOBILITY_WEIGHTS.get(sym.lower(), 0)
+        if sym in 'Nn':
+            knight[code] = weight
+        if sym in 'BbQq':
+            diagonal[code] = weight
+        if sym in 'RrQq':
+            straight[code] = weight
+
+    # knight_targets[s, t] is 1 if a knight on s attacks t
+    knight_targets = np.zeros((64, 64), dtype=np.float32)
+    for idx in range(64):
+        knight_targets[idx, move_tables.KNIGHT_ATTACKS[idx]] = 1
+
+    # rays[k, s, d] is the k-th square of ray d from s, or _PAD past the
+    # end of the ray
+    rays = np.full((7, 64, 8), _PAD, dtype=np.intp)
+    ray_diagonal = np.zeros((64, 8), dtype=np.int32)
+    ray_straight = np.zeros((64, 8), dtype=np.int32)
+    for idx in range(64):
+        for num, (ray, is_diagonal) in enumerate(move_tables.SLIDES[idx]):
+            rays[:len(ray), idx, num] = ray
+            ray_diagonal[idx, num] = is_diagonal
+            ray_straight[idx, num] = not is_diagonal
+
+    _TABLES = {'mg': mg, 'eg': eg, 'phase': phase, 'knight': knight,
+               'diagonal': diagonal, 'straight': straight,
+               'knight_targets': knight_targets, 'rays': rays,
+               'ray_diagonal': ray_diagonal, 'ray_straight': ray_straight}
+    return _TABLES
+
+
+def _fen_squares(fen):
+    """
+    Return the 64 piece symbols (' ' for empty squares) and the active
+    player of a FEN string, without building a `Game`.
+    """
+    fields = fen.split()
+    squares = fields[0].translate(_EXPAND)
+    if len(squares) != 64:
+        raise ValueError("Invalid FEN piece placement: {}".format(fen))
+    return squares, fields[1] if len(fields) > 1 else 'w'
+
+
+def _position_squares(position):
+    """
+    Return the 64 piece symbols and the active player of a FEN string, a
+    `Chessnut.Game`, a Chessnut board, or a `ChessBoard` (whose active
+    player is taken to be white).
+    """
+    if isinstance(position, str):
+        return _fen_squares(position)
+    if hasattr(position, 'state') and hasattr(position, 'board'):
+        get_piece = position.board.get_piece
+        return ''.join([get_piece(idx) for idx in range(64)]), \
+            position.state.player
+    if hasattr(position, 'get_piece'):
+        get_piece = position.get_piece
+        return ''.join([get_piece(idx) for idx in range(64)]), 'w'
+    if hasattr(position, 'data'):
+        return ''.join([''.join(row) for row in position.data]), 'w'
+    raise TypeError("Cannot evaluate position of type {}".format(
+        type(position).__name__))
+
+
+def pack_positions(positions):
+    """
+    Pack a sequence of positions into an `(N, 64)` int8 array of piece
+    codes, and an `(N,)` int8 array of active players (1 for white, -1 for
+    black).
+    """
+    _require_numpy()
+    squares = []
+    players = np.ones(len(positions), dtype=np.int8)
+    for num, position in enumerate(positions):
+        symbols, player = _position_squares(position)
+        squares.append(symbols)
+        if player == 'b':
+            players[num] = -1
+
+    # translate every symbol to its code with one table lookup
+    raw = np.frombuffer(''.join(squares).encode('ascii'), dtype=np.uint8)
+    boards = _symbol_codes()[raw].reshape(len(positions), 64)
+    if (boards < 0).any():
+        raise ValueError("Unknown piece symbol in positions")
+    return boards, players
+
+
+def to_planes(boards):
+    """
+    Expand an `(N, 64)` array of piece codes into `(N, 12, 64)` int8 planes
+    with a 1 for each piece (in PIECES order) on its square.
+    """
+    _require_numpy()
+    codes = np.arange(1, 13, dtype=np.int8)
+    return (boards[:, None, :] == codes[None, :, None]).astype(np.int8)
+
+
+def _from_planes(planes):
+    """Collapse `(N, 12, 64)` piece planes into `(N, 64)` piece codes."""
+    codes = np.arange(1, 13, dtype=np.int8)
+    return (planes * codes[None, :, None]).sum(axis=1).astype(np.int8)
+
+
+def evaluate_batch(fens_or_boards, players=None, mobility=True):
+    """
+    Return an `(N,)` int32 array with the evaluation of each position, in
+    centipawns from the point of view of the player to move.
+
+    `fens_or_boards` is either a sequence of positions (see
+    `pack_positions()`), or an already packed `(N, 64)` array of piece
+    codes or `(N, 12, 64)` array of piece planes; for packed arrays,
+    `players` gives the active player of each position (1 for white, -1 for
+    black), and defaults to white. The mobility term is left out if
+    `mobility` is False.
+    """
+    _require_numpy()
+    if isinstance(fens_or_boards, np.ndarray):
+        boards = fens_or_boards
+        if boards.ndim == 3:
+            boards = _from_planes(boards)
+        if players is None:
+            players = np.ones(len(boards), dtype=np.int8)
+    else:
+        boards, players = pack_positions(fens_or_boards)
+
+    if boards.ndim != 2 or boards.shape[1] != 64:
+        raise ValueError("Expected an (N, 64) or (N, 12, 64) array, got "
+                         "shape {}".format(boards.shape))
+
+    players = np.asarray(players, dtype=np.int32)
+    scores = np.empty(len(boards), dtype=np.int32)
+    for start in range(0, len(boards), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        scores[chunk] = _evaluate_chunk(boards[chunk].astype(np.intp),
+                                        players[chunk], mobility)
+    return scores
+
+
+def _evaluate_chunk(codes, players, mobility):
+    """Evaluate one chunk of `(n, 64)` piece codes."""
+    tables = _tables()
+    squares = np.arange(64)
+
+    mg = tables['mg'][codes, squares].sum(axis=1)
+    eg = tables['eg'][codes, squares].sum(axis=1)
+    phase = np.minimum(tables['phase'][codes].sum(axis=1), MAX_PHASE)
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+
+    if mobility:
+        score = score + _mobility(codes, tables)
+    return (score * players).astype(np.int32)
+
+
+def _mobility(codes, tables):
+    """
+    Return the mobility term (from white's point of view) of each position
+    in an `(n, 64)` array of piece codes.
+    """
+    # work on (square, position) arrays so that the gathers below copy
+    # contiguous rows; the extra row is the always occupied padding square
+    empty = np.zeros((65, len(codes)), dtype=bool)
+    empty[:64] = (codes == 0).T
+
+    # empty squares attacked by a knight on each square
+    knight_reach = tables['knight_targets'] @ empty[:64].astype(np.float32)
+
+    # empty squares reachable along each ray: a square counts while every
+    # square before it on the ray is empty, up to the first occupied (or
+    # padding) square; along[k] holds the k-th square of every ray
+    along = empty[tables['rays']]
+    open_ray = along[0].copy()
+    reach = open_ray.astype(np.int8)
+    for step in along[1:]:
+        open_ray &= step
+        reach += open_ray
+
+    diagonal_reach = np.einsum('sdn,sd->ns', reach, tables['ray_diagonal'])
+    straight_reach = np.einsum('sdn,sd->ns', reach, tables['ray_straight'])
+
+    return (tables['knight'][codes] * knight_reach.T.astype(np.int32) +
+            tables['diagonal'][codes] * diagonal_reach +
+            tables['straight'][codes] * straight_reach).sum(axis=1)
@@ -0,0 +1,135 @@
+"""
+Search benchmark for ChessEngine. Searches a fixed set of positions to a
+fixed depth and reports the nodes visited and the time taken, so that
+changes to the search (e.g., move ordering or pruning) can be compared by
+node count as well as by speed:
+
+    python -m ChessEngine.bench --depth 4
+
+    python -m ChessEngine.bench --depth 4 --no-ordering
+
+    python -m ChessEngine.bench --depth 4 --no-null-move --no-lmr
+
+    python -m ChessEngine.bench --depth 4 --no-pvs --no-aspiration
+
+    python -m ChessEngine.bench --depth 4 --workers 4
+
+    python -m ChessEngine.bench --depth 4 --log bench.jsonl
+"""
+
+import argparse
+import sys
+import time
+
+from Chessnut import Game
+from Chessnut.perft import POSITIONS
+
+from ChessEngine.parallel import ParallelSearch
+from ChessEngine.search import Search
+from ChessEngine.telemetry import JsonLinesLog
+
+
+def run(depth, tt_size=16, ordering=True, positions=POSITIONS, workers=1,
+        shared_tt=True, log=None, null_move=True, lmr=True, futility=True,
+        pvs=True, aspiration=True):
+    """
+    Search each position to `depth` plies with a new `Search` (or, if
+    `workers` is more than 1, with a `ParallelSearch` over that many
+    processes), print one line per position, and return the total number
+    of nodes searched. If `log` (a file path) is given, the statistics of
+    every iteration are appended to it as JSON lines. `null_move`, `lmr`,
+    `futility`, `pvs` and `aspiration` switch the selective search
+    techniques and the narrowed windows (the parallel search has no
+    aspiration windows).
+    """
+    options = {'ordering': ordering, 'null_move': null_move, 'lmr': lmr,
+               'futility': futility, 'pvs': pvs}
+    parallel = None
+    if workers > 1:
+        parallel = ParallelSearch(workers=workers, tt_size=tt_size,
+                                  shared_tt=shared_tt, **options)
+        parallel.start()
+    options['aspiration'] = aspiration
+
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, _ in positions:
+        engine = parallel or Search(tt_size=tt_size, **options)
+        game = Game(fen=fen)
+        listener = None
+        if log is not None:
+            listener = JsonLinesLog(log, position=name, fen=fen)
+            engine.add_listener(listener)
+        start = time.perf_counter()
+        result = engine.search(game, depth=depth)
+        elapsed = time.perf_counter() - start
+        if listener is not None:
+            engine.remove_listener(listener)
+            listener.close()
+        total_nodes += result.nodes
+        total_time += elapsed
+
+        hits = '-'
+        if parallel is None:
+            hits = "{:.1%}".format(engine.tt.hit_rate())
+        print("{:<12} depth {} move {:<6} score {:>6} nodes {:>9} "
+              "{:>7.3f} s {:>7.0f} nps  tt hits {:>5}".format(
+                  name, result.depth, result.move, result.score,
+                  result.nodes, elapsed,
+                  result.nodes / elapsed if elapsed else 0, hits))
+
+    if parallel is not None:
+        parallel.close()
+
+    print("Total: {} nodes in {:.3f} s ({:.0f} nps)".format(
+        total_nodes, total_time,
+        total_nodes / total_time if total_time else 0))
+    return total_nodes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ChessEngine.bench',
+        description='Search reference positions to a fixed depth.')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='search depth in plies (default: 4)')
+    parser.add_argument('--tt-size', type=float, default=16,
+                        help='transposition table size in MB (default: 16)')
+    parser.add_argument('--no-ordering', dest='ordering',
+                        action='store_false',
+                        help='search moves in generation order (captures '
+                             'in the quiescence search are still ranked)')
+    parser.add_argument('--no-null-move', dest='null_move',
+                        action='store_false',
+                        help='disable null move pruning')
+    parser.add_argument('--no-lmr', dest='lmr', action='store_false',
+                        help='disable late move reductions')
+    parser.add_argument('--no-futility', dest='futility',
+                        action='store_false',
+                        help='disable futility pruning')
+    parser.add_argument('--no-pvs', dest='pvs', action='store_false',
+                        help='search every move with the full window')
+    parser.add_argument('--no-aspiration', dest='aspiration',
+                        action='store_false',
+                        help='start every iteration with the full window')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='search root moves in this many processes '
+                             '(default: 1)')
+    parser.add_argument('--private-tt', dest='shared_tt',
+                        action='store_false',
+                        help='give each worker its own transposition table '
+                             'instead of one in shared memory')
+    parser.add_argument('--log', metavar='FILE',
+                        help='append the statistics of every iteration to '
+                             'FILE as JSON lines')
+    args = parser.parse_args(argv)
+
+    run(args.depth, args.tt_size, args.ordering, workers=args.workers,
+        shared_tt=args.shared_tt, log=args.log, null_move=args.null_move,
+        lmr=args.lmr, futility=args.futility, pvs=args.pvs,
+        aspiration=args.aspiration)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Static evaluation of chess positions. Scores are in centipawns, from the
+point of view of the player to move.
+
+`evaluate()` counts material only. `Evaluator` adds piece-square tables: each
+piece is worth a middlegame and an endgame score that depend on its square,
+and the two totals are blended by the game phase (how much non-pawn material
+is left). The totals are updated from the move in `push()`/`pop()`, so
+reading the score at a leaf of the search does not scan the board.
+
+`evaluate_mobility()` scores the number of empty squares each knight,
+bishop, rook and queen can reach. It needs move generation, so the search
+does not use it, but it is part of the batch evaluation in
+`ChessEngine.batch`.
+
+The piece values and tables are those of the PeSTO evaluation function.
+Tables are listed from white's point of view with 'a8' first, the same order
+as the board indices; black pieces use the square mirrored vertically.
+"""
+
+from Chessnut.encoding import PROMOTION, EN_PASSANT, CASTLING, PROMOTIONS
+from Chessnut.game import CASTLE_ROOKS
+from Chessnut import moves as move_tables
+
+# Material values of each piece in centipawns; black pieces count against
+# white
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0,
+                'p': -100, 'n': -320, 'b': -330, 'r': -500, 'q': -900,
+                'k': 0, ' ': 0}
+
+# Middlegame and endgame material values
+MG_VALUES = {'p': 82, 'n': 337, 'b': 365, 'r': 477, 'q': 1025, 'k': 0}
+EG_VALUES = {'p': 94, 'n': 281, 'b': 297, 'r': 512, 'q': 936, 'k': 0}
+
+# Contribution of each piece to the game phase; the starting position has
+# MAX_PHASE, and a position with only kings and pawns has 0
+PHASE_WEIGHTS = {'p': 0, 'n': 1, 'b': 1, 'r': 2, 'q': 4, 'k': 0}
+MAX_PHASE = 24
+
+# Centipawns per empty square a piece can reach
+MOBILITY_WEIGHTS = {'n': 4, 'b': 5, 'r': 2, 'q': 1}
+
+MG_PST = {
+    'p': [
+           0,    0,    0,    0,    0,    0,    0,    0,
+          98,  134,   61,   95,   68,  126,   34,  -11,
+          -6,    7,   26,   31,   65,   56,   25,  -20,
+         -14,   13,    6,   21,   23,   12,   17,  -23,
+         -27,   -2,   -5,   12,   17,    6,   10,  -25,
+         -26,   -4,   -4,  -10,    3,    3,   33,  -12,
+         -35,   -1,  -20,  -23,  -15,   24,   38,  -22,
+           0,    0,    0,    0,    0,    0,    0,    0],
+    'n': [
+        -167,  -89,  -34,  -49,   61,  -97,  -15, -107,
+         -73,  -41,   72,   36,   23,   62,    7,  -17,
+         -47,   60,   37,   65,   84,  129,   73,   44,
+          -9,   17,   19,   53,   37,   69,   18,   22,
+         -13,    4,   16,   13,   28,   19,   21,   -8,
+         -23,   -9,   12,   10,   19,   17,   25,  -16,
+         -29,  -53,  -12,   -3,   -1,   18,  -14,  -19,
+        -105,  -21,  -58,  -33,  -17,  -28,  -19,  -23],
+    'b': [
+         -29,    4,  -82,  -37,  -25,  -42,    7,   -8,
+         -26,   16,  -18,  -13,   30,   59,   18,  -47,
+         -16,   37,   43,   40,   35,   50,   37,   -2,
+          -4,    5,   19,   50,   37,   37,    7,   -2,
+          -6,   13,   13,   26,   34,   12,   10,    4,
+           0,   15,   15,   15,   14,   27,   18,   10,
+           4,   15,   16,    0,    7,   21,   33,    1,
+         -33,   -3,  -14,  -21,  -13,  -12,  -39,  -21],
+    'r': [
+          32,   42,   32,   51,   63,    9,   31,   43,
+          27,   32,   58,   62,   80,   67,   26,   44,
+          -5,   19,   26,   36,   17,   45,   61,   16,
+         -24,  -11,    7,   26,   24,   35,   -8,  -20,
+         -36,  -26,  -12,   -1,    9,   -7,    6,  -23,
+         -45,  -25,  -16,  -17,    3,    0,   -5,  -33,
+         -44,  -16,  -20,   -9,   -1,   11,   -6,  -71,
+         -19,  -13,    1,   17,   16,    7,  -37,  -26],
+    'q': [
+         -28,    0,   29,   12,   59,   44,   43,   45,
+         -24,  -39,   -5,    1,  -16,   57,   28,   54,
+         -13,  -17,    7,    8,   29,   56,   47,   57,
+         -27,  -27,  -16,  -16,   -1,   17,   -2,    1,
+          -9,  -26,   -9,  -10,   -2,   -4,    3,   -3,
+         -14,    2,  -11,   -2,   -5,    2,   14,    5,
+         -35,   -8,   11,    2,    8,   15,   -3,    1,
+          -1,  -18,   -9,   10,  -15,  -25,  -31,  -50],
+    'k': [
+         -65,   23,   16,  -15,  -56,  -34,    2,   13,
+          29,   -1,  -20,   -7,   -8,   -4,  -38,  -29,
+          -9,   24,    2,  -16,  -20,    6,   22,  -22,
+         -17,  -20,  -12,  -27,  -30,  -25,  -14,  -36,
+         -49,   -1,  -27,  -39,  -46,  -44,  -33,  -51,
+         -14,  -14,  -22,  -46,  -44,  -30,  -15,  -27,
+           1,    7,   -8,  -64,  -43,  -16,    9,    8,
+         -15,   36,   12,  -54,    8,  -28,   24,   14]
+}
+
+EG_PST = {
+    'p': [
+           0,    0,    0,    0,    0,    0,    0,    0,
+         178,  173,  158,  134,  147,  132,  165,  187,
+          94,  100,   85,   67,   56,   53,   82,   84,
+          32,   24,   13,    5,   -2,    4,   17,   17,
+          13,    9,   -3,   -7,   -7,   -8,    3,   -1,
+           4,    7,   -6,    1,    0,   -5,   -1,   -8,
+          13,    8,    8,   10,   13,    0,    2,   -7,
+           0,    0,    0,    0,    0,    0,    0,    0],
+    'n': [
+         -58,  -38,  -13,  -28,  -31,  -27,  -63,  -99,
+         -25,   -8,  -25,   -2,   -9,  -25,  -24,  -52,
+         -24,  -20,   10,    9,   -1,   -9,  -19,  -41,
+         -17,    3,   22,   22,   22,   11,    8,  -18,
+         -18,   -6,   16,   25,   16,   17,    4,  -18,
+         -23,   -3,   -1,   15,   10,   -3,  -20,  -22,
+         -42,  -20,  -10,   -5,   -2,  -20,  -23,  -44,
+         -29,  -51,  -23,  -15,  -22,  -18,  -50,  -64],
+    'b': [
+         -14,  -21,  -11,   -8,   -7,   -9,  -17,  -24,
+          -8,   -4,    7,  -12,   -3,  -13,   -4,  -14,
+           2,   -8,    0,   -1,   -2,    6,    0,    4,
+          -3,    9,   12,    9,   14,   10,    3,    2,
+          -6,    3,   13,   19,    7,   10,   -3,   -9,
+         -12,   -3,    8,   10,   13,    3,   -7,  -15,
+         -14,  -18,   -7,   -1,    4,   -9,  -15,  -27,
+         -23,   -9,  -23,   -5,   -9,  -16,   -5,  -17],
+    'r': [
+          13,   10,   18,   15,   12,   12,    8,    5,
+          11,   13,   13,   11,   -3,    3,    8,    3,
+           7,    7,    7,    5,    4,   -3,   -5,   -3,
+           4,    3,   13,    1,    2,    1,   -1,    2,
+           3,    5,    8,    4,   -5,   -6,   -8,  -11,
+          -4,    0,   -5,   -1,   -7,  -12,   -8,  -16,
+          -6,   -6,    0,    2,   -9,   -9,  -11,   -3,
+          -9,    2,    3,   -1,   -5,  -13,    4,  -20],
+    'q': [
+          -9,   22,   22,   27,   27,   19,   10,   20,
+         -17,   20,   32,   41,   58,   25,   30,    0,
+         -20,    6,    9,   49,   47,   35,   19,    9,
+           3,   22,   24,   45,   57,   40,   57,   36,
+         -18,   28,   19,   47,   31,   34,   39,   23,
+         -16,  -27,   15,    6,    9,   17,   10,    5,
+         -22,  -23,  -30,  -16,  -16,  -23,  -36,  -32,
+         -33,  -28,  -22,  -43,   -5,  -32,  -20,  -41],
+    'k': [
+         -74,  -35,  -18,  -18,  -11,   15,    4,  -17,
+         -12,   17,   14,   17,   17,   38,   23,   11,
+          10,   17,   23,   15,   20,   45,   44,   13,
+          -8,   22,   24,   27,   26,   33,   26,    3,
+         -18,   -4,   21,   24,   27,   23,    9,  -11,
+         -19,   -3,   11,   21,   23,   16,    7,   -9,
+         -27,  -11,    4,   13,   14,    4,   -5,  -17,
+         -53,  -34,  -21,  -11,  -28,  -14,  -24,  -43]
+}
+
+
+def _signed_tables(values, pst):
+    """
+    Combine material values and piece-square tables into one table per
+    piece symbol, indexed by board index, with black pieces negated.
+    """
+    tables = {' ': [0] * 64}
+    for sym in 'pnbrqk':
+        tables[sym.upper()] = [values[sym] + pst[sym][idx]
+                               for idx in range(64)]
+        tables[sym] = [-values[sym] - pst[sym][idx ^ 56]
+                       for idx in range(64)]
+    return tables
+
+
+MG_TABLES = _signed_tables(MG_VALUES, MG_PST)
+EG_TABLES = _signed_tables(EG_VALUES, EG_PST)
+PHASES = dict(PHASE_WEIGHTS, **{sym.upper(): weight
+                                for sym, weight in PHASE_WEIGHTS.items()})
+PHASES[' '] = 0
+
+
+def evaluate(game):
+    """
+    Return the material balance of the position in `game` from the point
+    of view of the player to move.
+    """
+    get_piece = game.board.get_piece
+    score = sum(PIECE_VALUES[get_piece(idx)] for idx in range(64))
+    return score if game.state.player == 'w' else -score
+
+
+def evaluate_pst(game):
+    """
+    Return the piece-square evaluation of the position in `game` from the
+    point of view of the player to move, computed by scanning the board.
+    This is the score `Evaluator` keeps up to date incrementally.
+    """
+    mg, eg, phase = _totals(game)
+    return _blend(mg, eg, phase, game.state.player)
+
+
+def evaluate_mobility(game):
+    """
+    Return the mobility score of the position in `game` from the point of
+    view of the player to move: the empty squares reachable by each knight,
+    bishop, rook and queen (ignoring pins and checks), weighted by
+    MOBILITY_WEIGHTS, counted for white and against black.
+    """
+    get_piece = game.board.get_piece
+    score = 0
+    for idx in range(64):
+        piece = get_piece(idx)
+        sym = piece.lower()
+        if sym not in MOBILITY_WEIGHTS:
+            continue
+
+        count = 0
+        if sym == 'n':
+            for end in move_tables.KNIGHT_ATTACKS[idx]:
+                count += get_piece(end) == ' '
+        else:
+            for ray, diagonal in move_tables.SLIDES[idx]:
+                if sym == 'b' and not diagonal or sym == 'r' and diagonal:
+                    continue
+                for end in ray:
+                    if get_piece(end) != ' ':
+                        break
+                    count += 1
+
+        weight = MOBILITY_WEIGHTS[sym]
+        score += count * weight if piece.isupper() else -count * weight
+    return score if game.state.player == 'w' else -score
+
+
+def _totals(game):
+    """
+    Return the middlegame and endgame totals (from white's point of view)
+    and the phase of the position in `game`.
+    """
+    get_piece = game.board.get_piece
+    mg = eg = phase = 0
+    for idx in range(64):
+        piece = get_piece(idx)
+        mg += MG_TABLES[piece][idx]
+        eg += EG_TABLES[piece][idx]
+        phase += PHASES[piece]
+    return mg, eg, phase
+
+
+def _blend(mg, eg, phase, player):
+    """
+    Blend the middlegame and endgame totals by the game phase, and return
+    the result from the point of view of `player`.
+    """
+    phase = min(phase, MAX_PHASE)
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if player == 'w' else -score
+
+
+class Evaluator(object):
+    """
+    This class keeps the piece-square totals of a game position up to date
+    as moves are made and taken back. Call `reset()` with the game before a
+    search, then `push()` each move *before* it is applied to the game with
+    `Game.push()` (the evaluator reads the pieces involved from the board),
+    and `pop()` whenever a move is taken back. `score()` returns the
+    evaluation of the current position in constant time.
+    """
+
+    def __init__(self):
+        self.mg = 0
+        self.eg = 0
+        self.phase = 0
+        self._stack = []
+
+    def reset(self, game):
+        """Compute the totals for the position in `game` from scratch."""
+        self.mg, self.eg, self.phase = _totals(game)
+        self._stack = []
+
+    def push(self, game, move):
+        """
+        Update the totals for the integer `move`, which is about to be
+        made in `game`.
+        """
+        self._stack.append((self.mg, self.eg, self.phase))
+        get_piece = game.board.get_piece
+        start = move & 63
+        end = move >> 6 & 63
+        flag = move >> 14
+        piece = get_piece(start)
+        target = get_piece(end)
+
+        new_piece = piece
+        if flag == PROMOTION:
+            new_piece = PROMOTIONS[move >> 12 & 3]
+            if piece == 'P':
+                new_piece = new_piece.upper()
+
+        mg = self.mg - MG_TABLES[piece][start] + MG_TABLES[new_piece][end]
+        eg = self.eg - EG_TABLES[piece][start] + EG_TABLES[new_piece][end]
+        phase = self.phase + PHASES[new_piece] - PHASES[piece]
+
+        if target != ' ':
+            mg -= MG_TABLES[target][end]
+            eg -= EG_TABLES[target][end]
+            phase -= PHASES[target]
+
+        if flag == CASTLING:
+            r_start, r_end = CASTLE_ROOKS[end]
+            rook = get_piece(r_start)
+            mg += MG_TABLES[rook][r_end] - MG_TABLES[rook][r_start]
+            eg += EG_TABLES[rook][r_end] - EG_TABLES[rook][r_start]
+
+        elif flag == EN_PASSANT:
+            cap_idx = end + 8 if end < 24 else end - 8
+            passed = get_piece(cap_idx)
+            mg -= MG_TABLES[passed][cap_idx]
+            eg -= EG_TABLES[passed][cap_idx]
+
+        self.mg = mg
+        self.eg = eg
+        self.phase = phase
+
+    def pop(self):
+        """Restore the totals from before the last `push()`."""
+        self.mg, self.eg, self.phase = self._stack.pop()
+
+    def score(self, game):
+        """
+        Return the evaluation of the current position in `game` from the
+        point of view of the player to move.
+        """
+        return _blend(self.mg, self.eg, self.phase, game.state.player)
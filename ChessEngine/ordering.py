@@ -0,0 +1,140 @@
+"""
+Move ordering for the search. Alpha-beta prunes the most when the best move
+is searched first, so before searching a node the legal moves are ranked:
+
+    1. the transposition table move (the best move of an earlier search)
+    2. captures and promotions, most valuable victim first, and then least
+       valuable attacker first (MVV-LVA)
+    3. killer moves - quiet moves that caused a cutoff at the same ply in
+       another branch
+    4. the other quiet moves, by how often they caused cutoffs anywhere in
+       the tree (the history heuristic)
+
+Each move is given an integer score and packed as `score << 16 | move`, so
+that a list of moves is ordered with one sort of plain integers.
+"""
+
+from array import array
+
+from Chessnut.encoding import PROMOTION, EN_PASSANT
+
+# Ranks of the pieces as victims and as attackers
+PIECE_RANKS = {'p': 1, 'n': 2, 'b': 3, 'r': 4, 'q': 5, 'k': 6,
+               'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}
+
+# Score bands of each class of move; history scores stay below KILLER
+TT_SCORE = 1 << 24
+CAPTURE_SCORE = 1 << 23
+KILLER_SCORE = 1 << 22
+HISTORY_LIMIT = KILLER_SCORE - 1
+
+# Ranks of the promotion pieces (in `Chessnut.encoding.PROMOTIONS` order)
+PROMOTION_RANKS = [2, 3, 4, 5]
+
+KILLERS_PER_PLY = 2
+
+
+class MoveOrderer(object):
+    """
+    This class ranks the moves of a node and keeps the killer moves (per
+    ply) and the history table (per side, start and end square) that are
+    updated by the search whenever a quiet move causes a cutoff.
+    """
+
+    def __init__(self, max_ply=128):
+        self.max_ply = max_ply
+        self.clear()
+
+    def clear(self):
+        """Forget all killer moves and history scores."""
+        self.killers = [[0] * KILLERS_PER_PLY
+                        for _ in range(self.max_ply + 2)]
+        self.history = array('l', bytes(array('l').itemsize * 2 * 4096))
+
+    def new_search(self):
+        """
+        Prepare for a new search: the killers of the last search are
+        dropped, and the history scores are halved so that recent cutoffs
+        count for more.
+        """
+        self.killers = [[0] * KILLERS_PER_PLY
+                        for _ in range(self.max_ply + 2)]
+        history = self.history
+        for idx in range(len(history)):
+            history[idx] >>= 1
+
+    def order(self, game, moves, ply, tt_move=0):
+        """
+        Return the integer `moves` of the position in `game` sorted from
+        most to least promising, given the transposition table move.
+        """
+        get_piece = game.board.get_piece
+        killers = self.killers[ply]
+        history = self.history
+        side = 0 if game.state.player == 'w' else 4096
+
+        keys = []
+        for move in moves:
+            if move == tt_move:
+                score = TT_SCORE
+            else:
+                victim = get_piece(move >> 6 & 63)
+                flag = move >> 14
+                if victim != ' ' or flag == EN_PASSANT:
+                    score = CAPTURE_SCORE + \
+                        PIECE_RANKS.get(victim, 1) * 8 - \
+                        PIECE_RANKS[get_piece(move & 63)]
+                    if flag == PROMOTION:
+                        score += PROMOTION_RANKS[move >> 12 & 3] * 8
+                elif flag == PROMOTION:
+                    score = CAPTURE_SCORE + \
+                        PROMOTION_RANKS[move >> 12 & 3] * 8 - 1
+                elif move in killers:
+                    score = KILLER_SCORE + KILLERS_PER_PLY - \
+                        killers.index(move)
+                else:
+                    score = history[side + (move & 0xFFF)]
+            keys.append(score << 16 | move)
+
+        keys.sort(reverse=True)
+        return [key & 0xFFFF for key in keys]
+
+    def order_captures(self, game, moves):
+        """
+        Return the integer captures and promotions in `moves` sorted by
+        MVV-LVA, for the quiescence search.
+        """
+        get_piece = game.board.get_piece
+        keys = []
+        for move in moves:
+            score = PIECE_RANKS.get(get_piece(move >> 6 & 63), 1) * 8 - \
+                PIECE_RANKS[get_piece(move & 63)]
+            if move >> 14 == PROMOTION:
+                score += PROMOTION_RANKS[move >> 12 & 3] * 8
+            keys.append(score << 16 | move)
+
+        keys.sort(reverse=True)
+        return [key & 0xFFFF for key in keys]
+
+    def cutoff(self, game, move, depth, ply):
+        """
+        Record that the quiet `move` caused a beta cutoff at `ply` with
+        `depth` plies left to search.
+        """
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        history = self.history
+        idx = (0 if game.state.player == 'w' else 4096) + (move & 0xFFF)
+        history[idx] += depth * depth
+        if history[idx] > HISTORY_LIMIT:
+            for idx in range(len(history)):
+                history[idx] >>= 1
+
+    @staticmethod
+    def is_quiet(game, move):
+        """Return True if `move` neither captures nor promotes."""
+        return move >> 14 != PROMOTION and move >> 14 != EN_PASSANT and \
+            game.board.get_piece(move >> 6 & 63) == ' '
@@ -0,0 +1,267 @@
+"""
+Parallel search over a pool of worker processes. Python threads cannot
+search on more than one core at a time, so the root moves of a position are
+split across a `multiprocessing` pool instead. Each iteration of the
+iterative deepening first searches the best move of the previous iteration,
+and then sends every other root move to a worker, which searches it with its
+own `Search` only to find out whether it beats that score. The results are
+combined into one best move with the nodes of all workers added up.
+
+The workers are started the first time they are needed and kept for later
+searches, so each keeps its history table between moves. By default they
+all use one transposition table in shared memory, so that a position one
+worker has searched is not searched again by the others:
+
+    from ChessEngine.parallel import ParallelSearch
+
+    with ParallelSearch(workers=4) as engine:
+        result = engine.search(game, time_limit=5)
+
+With the 'spawn' start method (the default on Windows and macOS), the main
+module of the program is imported again in every worker, so programs using
+ParallelSearch there must guard their entry point with
+`if __name__ == '__main__':`.
+"""
+
+import multiprocessing
+import os
+import signal
+import time
+from array import array
+from time import perf_counter
+
+from Chessnut import Game
+from Chessnut.encoding import to_str
+
+from ChessEngine.search import (Search, SearchInfo, SearchResult,
+                                SearchTimeout, MATE, INFINITY, MAX_DEPTH,
+                                MAX_PLY)
+from ChessEngine.tt import TranspositionTable, GENERATIONS
+
+# The search of each worker process, created by _init_worker()
+_engine = None
+_search_id = None
+
+
+def _init_worker(tt_size, tt_name, options):
+    """
+    Create the persistent search of a worker process, using the shared
+    transposition table `tt_name` if given, or a table of its own, and the
+    keyword arguments `options` of `Search`.
+    """
+    global _engine
+    # a forked worker inherits the signal handlers of its parent (e.g., the
+    # GUI's, which turn SIGTERM into a quit event), and would then survive
+    # the SIGTERM that `Pool.terminate()` stops it with
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    tt = None
+    if tt_name is not None:
+        tt = TranspositionTable.attach(tt_name, tt_size)
+    _engine = Search(tt_size=tt_size, tt=tt, **options)
+
+
+def _search_root_move(task):
+    """
+    Search one root move in a worker process. `task` holds the id of the
+    parallel search, the root position as a FEN string with the position
+    keys since the last capture or pawn move (for repetition draws), the
+    integer move, the depth, the score to beat, and the deadline as a
+    `time.time()` timestamp (or None), which is shared by all processes so
+    that moves queued behind others do not get a fresh budget. Returns
+    `(move, score, pv, nodes)`, with a score of None if the deadline passed
+    first.
+    """
+    global _search_id
+    search_id, fen, keys, move, depth, alpha, deadline = task
+
+    time_left = None
+    if deadline is not None:
+        time_left = deadline - time.time()
+        if time_left <= 0:
+            return move, None, [move], 0
+
+    game = Game(fen=fen, history='compact')
+    game.key_history = array('Q', keys)
+
+    if search_id != _search_id:
+        _engine.prepare(game, time_left)
+        # keep the generation of a shared table the same in every worker
+        _engine.tt.generation = search_id % GENERATIONS
+        _search_id = search_id
+    else:
+        _engine.prepare(game, time_left, new_search=False)
+    try:
+        score, pv = _engine.search_move(game, move, depth, alpha)
+    except SearchTimeout:
+        return move, None, [move], _engine.nodes
+    return move, score, pv, _engine.nodes
+
+
+class ParallelSearch(object):
+    """
+    This class searches a game position by splitting its root moves across
+    `workers` processes (all available cores by default). The workers share
+    one transposition table of `tt_size` megabytes, or each have their own
+    if `shared_tt` is False. The move ordering, selective search techniques
+    and windows of the workers are switched with `ordering`, `null_move`,
+    `lmr`, `futility` and `pvs` as for `Search`. `search()` takes the same
+    arguments and returns the same `SearchResult` as `Search.search()`;
+    `nodes` counts the nodes searched by every worker.
+
+    Listeners added with `add_listener()` get a `SearchInfo` after every
+    iteration, as with `Search`. The statistics kept inside the workers
+    (the deepest ply, the table hit rate, the cutoff rate and the re-search
+    counts) are None.
+    """
+
+    def __init__(self, workers=None, tt_size=16, shared_tt=True,
+                 ordering=True, null_move=True, lmr=True, futility=True,
+                 pvs=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.tt_size = tt_size
+        self.shared_tt = shared_tt
+        self.options = {'ordering': ordering, 'null_move': null_move,
+                        'lmr': lmr, 'futility': futility, 'pvs': pvs}
+        self.tt = None
+        self.nodes = 0
+        self._pool = None
+        self._searches = 0
+        self._stopped = False
+        self.listeners = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Start the worker processes, if they are not running yet."""
+        if self._pool is None:
+            tt_name = None
+            if self.shared_tt:
+                self.tt = TranspositionTable(self.tt_size, shared=True)
+                tt_name = self.tt.name
+            self._pool = multiprocessing.Pool(self.workers,
+                                              initializer=_init_worker,
+                                              initargs=(self.tt_size,
+                                                        tt_name,
+                                                        self.options))
+
+    def close(self):
+        """Stop the worker processes and free the shared table."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        if self.tt is not None:
+            self.tt.close()
+            self.tt = None
+
+    def search(self, game, depth=MAX_DEPTH, time_limit=None):
+        """
+        Search the position in `game` to 1, 2, ... `depth` plies, searching
+        the root moves of each iteration in parallel, and return a
+        `SearchResult` for the deepest iteration that completed. As with
+        `Search`, the first iteration is always finished. The game itself is
+        not modified.
+        """
+        start = perf_counter()
+        self.start()
+        self.nodes = 0
+        self._searches += 1
+        self._stopped = False
+        if self.tt is not None:
+            # the workers store entries in this generation of the shared
+            # table; match it so that `usage()` counts them
+            self.tt.generation = self._searches % GENERATIONS
+
+        moves = game.get_moves(as_int=True)
+        if not moves:
+            return SearchResult(None, 0, [], 0, 0)
+
+        fen = game.get_fen()
+        keys = list(game.key_history[-(game.state.ply + 1):])
+        deadline = None
+        if time_limit is not None:
+            # wall-clock time, so that it means the same in every process
+            deadline = time.time() + time_limit
+
+        result = None
+        for iteration in range(1, max(min(depth, MAX_PLY), 1) + 1):
+            # the first iteration runs without a deadline and is not
+            # stopped, so that the move played has been searched
+            limit = deadline if result is not None else None
+
+            # the first move gets an exact score, which the other moves are
+            # then searched against in parallel
+            first = self._map(fen, keys, moves[:1], iteration, -INFINITY,
+                              limit)
+            if first is None or self._stopped and result is not None:
+                break
+            replies = self._map(fen, keys, moves[1:], iteration, first[0][1],
+                                limit)
+            if replies is None or self._stopped and result is not None:
+                break
+
+            # stable sort: moves that failed low keep their previous order
+            replies = sorted(first + replies, key=lambda reply: reply[1],
+                             reverse=True)
+            moves = [reply[0] for reply in replies]
+            _, score, pv, _ = replies[0]
+            pv = [to_str(m) for m in pv]
+            result = SearchResult(pv[0], score, pv, iteration, self.nodes)
+            self._report(iteration, score, pv, perf_counter() - start)
+
+            if abs(score) >= MATE - MAX_PLY:
+                break
+            if time_limit is not None and \
+                    perf_counter() - start > time_limit * 0.5:
+                break
+
+        return result
+
+    def add_listener(self, listener):
+        """
+        Call `listener` with a `SearchInfo` after each completed iteration
+        of later searches.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop calling a listener added with `add_listener()`."""
+        self.listeners.remove(listener)
+
+    def _report(self, depth, score, pv, elapsed):
+        """Send the statistics of a completed iteration to the listeners."""
+        if not self.listeners:
+            return
+        info = SearchInfo(depth, None, score, self.nodes,
+                          int(self.nodes / elapsed) if elapsed else 0,
+                          elapsed, None,
+                          self.tt.usage() if self.tt is not None else None,
+                          None, pv, None, None)
+        for listener in list(self.listeners):
+            listener(info)
+
+    def stop(self):
+        """
+        Ask a search running in another thread to stop. The root moves
+        already sent to the workers are still searched, but no further
+        moves or iterations are started.
+        """
+        self._stopped = True
+
+    def _map(self, fen, keys, moves, depth, alpha, deadline):
+        """
+        Search the root `moves` of the position `fen` in the worker
+        processes and return their replies, or None if the `deadline` (a
+        `time.time()` timestamp) passed before every move was searched.
+        """
+        tasks = [(self._searches, fen, keys, move, depth, alpha, deadline)
+                 for move in moves]
+        replies = self._pool.map(_search_root_move, tasks, chunksize=1)
+        self.nodes += sum(reply[3] for reply in replies)
+        if any(reply[1] is None for reply in replies):
+            return None
+        return replies
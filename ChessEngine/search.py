@@ -0,0 +1,590 @@
+"""
+Negamax search with alpha-beta pruning over a `Chessnut.Game`.
+
+Negamax scores every position from the point of view of the player to move,
+so the score of a move is the negated score of the position it leads to.
+Alpha-beta pruning stops searching the replies to a move as soon as one of
+them shows the move is worse than an alternative already found.
+
+The search deepens iteratively (1 ply, 2 plies, ...) so that when a time
+limit is given it can stop at the deadline and still return the best move of
+the deepest iteration that completed.
+
+A search can also be started on the opponent's time (pondering), on the
+position after the reply it expects: it then runs without a deadline until
+`ponderhit()` reports that the expected reply was played, which puts it back
+on the clock, or until `stop()` is called because another move was played.
+
+After each iteration the search reports its statistics as a `SearchInfo` to
+the listeners added with `add_listener()` (see also
+`ChessEngine.telemetry`).
+
+At the end of each line the search keeps playing captures and promotions
+(quiescence search) until the position is quiet, so that leaves are not
+scored in the middle of an exchange.
+
+The search is also selective, spending less effort on moves that are
+unlikely to matter (each technique can be switched off):
+
+    null move pruning - if passing the turn still leaves the player to move
+        at or above beta in a reduced search, the real moves will too; not
+        tried in check or with only the king and pawns left, where passing
+        may be the best "move" (zugzwang)
+    late move reductions - quiet moves ordered late are searched one or two
+        plies shallower, and searched again at full depth if they turn out
+        to raise alpha
+    futility pruning - one or two plies from the horizon, quiet moves are
+        skipped when the static evaluation plus a margin cannot reach alpha
+
+Moves that give check are never reduced or pruned.
+
+Only the first move of a node is searched with the full alpha-beta window
+(principal variation search): the others are searched with a null window
+around alpha, which only proves they are no better, and are searched again
+with the full window if one turns out to be. Each iteration also starts
+with a narrow aspiration window around the score of the previous one, and
+widens it if the score falls outside. The `SearchInfo` of each iteration
+counts both kinds of re-searches.
+"""
+
+from collections import namedtuple
+from time import perf_counter
+
+from Chessnut.encoding import to_str
+
+from ChessEngine.evaluate import Evaluator
+from ChessEngine.ordering import MoveOrderer
+from ChessEngine.tt import TranspositionTable, EXACT, LOWER, UPPER
+
+# Score of a checkmate at the root; mates found deeper in the tree score
+# less, so the search prefers the fastest mate (and the slowest loss)
+MATE = 100000
+INFINITY = 1000000
+
+# Deepest iteration the search will start, and the most plies it will look
+# ahead from the root
+MAX_DEPTH = 64
+MAX_PLY = 128
+
+# The clock is read once every this many nodes (must be a power of two)
+CHECK_INTERVAL = 64
+
+# Null move pruning: the null move is searched this many plies shallower
+# than a normal move (one more from NULL_MOVE_DEEP plies), at nodes of at
+# least NULL_MOVE_MIN_DEPTH plies
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_DEEP = 7
+NULL_MOVE_MIN_DEPTH = 3
+
+# Late move reductions: quiet moves after the first LMR_MIN_MOVES moves of
+# a node of at least LMR_MIN_DEPTH plies are reduced by one ply, and by two
+# plies after LMR_LATE_MOVES moves
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+LMR_LATE_MOVES = 8
+
+# Futility pruning: margins in centipawns by the depth left (1 or 2 plies)
+FUTILITY_MARGINS = [0, 200, 500]
+
+# Aspiration windows: from ASPIRATION_MIN_DEPTH plies, an iteration is
+# first searched within ASPIRATION_WINDOW centipawns of the previous score;
+# the window is widened four times on each side it fails, and opened up
+# fully once it is more than ASPIRATION_MAX_WINDOW
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 30
+ASPIRATION_MAX_WINDOW = 1000
+
+# Best move (in simple algebraic notation), its score in centipawns from the
+# point of view of the player to move, the principal variation, the depth
+# searched, and the number of nodes visited
+SearchResult = namedtuple('SearchResult',
+                          ['move', 'score', 'pv', 'depth', 'nodes'])
+
+# Statistics of a completed iteration: its depth, the deepest ply reached
+# (including the quiescence search), the score, the nodes searched so far
+# and per second, the seconds since the search started, the fraction of
+# transposition table probes that hit and of its slots in use, the fraction
+# of beta cutoffs caused by the first move searched (a measure of the move
+# ordering), the principal variation, and the number of null window moves
+# searched again with the full window and of aspiration windows that failed
+# (both since the search started). Fields a search cannot measure are None.
+SearchInfo = namedtuple('SearchInfo',
+                        ['depth', 'seldepth', 'score', 'nodes', 'nps', 'time',
+                         'tt_hit_rate', 'tt_fill', 'first_cutoff_rate',
+                         'pv', 'pvs_researches', 'aspiration_researches'])
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the deadline passes, to unwind back to
+    the root.
+    """
+    pass
+
+
+def time_budget(remaining, increment=0.0, moves_to_go=40):
+    """
+    Return the number of seconds to spend on the next move given the time
+    `remaining` on the clock, the `increment` added after each move, and the
+    number of moves the remaining time must last. At most half of the
+    remaining time is used, less a small safety margin.
+    """
+    budget = remaining / moves_to_go + increment * 0.75
+    return max(min(budget, remaining * 0.5 - 0.05), 0.01)
+
+
+class Search(object):
+    """
+    This class searches a game position with iterative deepening and
+    reports the best move. The game is modified in place during the search
+    with `push()`/`pop()`, and is returned to its original position
+    afterwards, even when the search stops at its deadline.
+
+    Results are kept in a transposition table of `tt_size` megabytes (or in
+    the given `tt`, e.g., a shared one), which is shared by the iterations
+    of a search and by later searches. Moves are
+    searched in the order ranked by a `MoveOrderer`; with `ordering=False`
+    only the transposition table move is moved to the front, which is
+    useful to measure how many nodes the ordering saves. Likewise
+    `null_move`, `lmr` and `futility` switch the selective search
+    techniques on or off individually, and `pvs` and `aspiration` the
+    narrowed windows.
+
+    Listeners added with `add_listener()` are called with a `SearchInfo`
+    after every iteration, in the thread running the search.
+    """
+
+    def __init__(self, tt_size=16, ordering=True, tt=None, null_move=True,
+                 lmr=True, futility=True, pvs=True, aspiration=True):
+        self.tt = tt or TranspositionTable(tt_size)
+        self.orderer = MoveOrderer(MAX_PLY)
+        self.evaluator = Evaluator()
+        self.ordering = ordering
+        self.null_move = null_move
+        self.lmr = lmr
+        self.futility = futility
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.nodes = 0
+        self.seldepth = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self.pvs_researches = 0
+        self.aspiration_researches = 0
+        self.listeners = []
+        self._pv = [[] for _ in range(MAX_PLY + 2)]
+        self._start = 0.0
+        self._time_limit = None
+        self._deadline = None
+        self._interruptible = True
+        self.pondering = False
+
+    def search(self, game, depth=MAX_DEPTH, time_limit=None, ponder=False):
+        """
+        Search the position in `game` to 1, 2, ... `depth` plies and return
+        a `SearchResult` for the deepest iteration that completed. If
+        `time_limit` (in seconds) is given, the search stops when it runs
+        out, and a new iteration is not started once most of it is used.
+        The first iteration is always finished (even after `stop()`), so
+        the move returned has been searched. The move is None if the player
+        to move has no legal moves.
+
+        If `ponder` is True, the search only stops for its time limit once
+        `ponderhit()` is called (from another thread).
+        """
+        self.prepare(game, time_limit, ponder=ponder)
+        self._interruptible = False
+
+        result = None
+        for iteration in range(1, max(min(depth, MAX_PLY), 1) + 1):
+            try:
+                if result is None:
+                    score = self._negamax(game, iteration, -INFINITY,
+                                          INFINITY, 0)
+                else:
+                    score = self._aspiration(game, iteration, result.score)
+            except SearchTimeout:
+                break
+
+            pv = [to_str(m) for m in self._pv[0]]
+            result = SearchResult(pv[0] if pv else None, score, pv,
+                                  iteration, self.nodes)
+            self._interruptible = True
+            self._report(iteration, score, pv)
+
+            # stop when there is nothing to search or a forced mate has
+            # been found, or when the next iteration would likely not
+            # finish before the deadline
+            if not pv or abs(score) >= MATE - MAX_PLY:
+                break
+            if self._time_limit is not None and not self.pondering and \
+                    perf_counter() - self._start > self._time_limit * 0.5:
+                break
+
+        self.pondering = False
+        return result
+
+    def _aspiration(self, game, depth, score):
+        """
+        Search the position in `game` to `depth` plies within a window
+        around the `score` of the previous iteration, widening the side of
+        the window the score falls outside of until it is inside.
+        """
+        if not self.aspiration or depth < ASPIRATION_MIN_DEPTH or \
+                abs(score) >= MATE - MAX_PLY:
+            return self._negamax(game, depth, -INFINITY, INFINITY, 0)
+
+        low = high = ASPIRATION_WINDOW
+        while True:
+            alpha = score - low if low <= ASPIRATION_MAX_WINDOW else -INFINITY
+            beta = score + high if high <= ASPIRATION_MAX_WINDOW else INFINITY
+            result = self._negamax(game, depth, alpha, beta, 0)
+            if alpha < result < beta:
+                return result
+            self.aspiration_researches += 1
+            if result <= alpha:
+                low *= 4
+            else:
+                high *= 4
+            score = result
+
+    def prepare(self, game, time_limit=None, new_search=True, ponder=False):
+        """
+        Reset the node counter and the deadline for a search of the
+        position in `game`. Unless `new_search` is False (e.g., when
+        continuing the same search from another root move), the tables also
+        start a new search generation. If `ponder` is True, the deadline is
+        only set by `ponderhit()`.
+        """
+        self._start = perf_counter()
+        self._time_limit = time_limit
+        self._deadline = None
+        self._interruptible = True
+        self.pondering = ponder
+        if time_limit is not None and not ponder:
+            self._deadline = self._start + time_limit
+        self.nodes = 0
+        self.seldepth = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self.pvs_researches = 0
+        self.aspiration_researches = 0
+        self.evaluator.reset(game)
+        if new_search:
+            self.tt.new_search()
+            self.tt.reset_stats()
+            self.orderer.new_search()
+
+    def add_listener(self, listener):
+        """
+        Call `listener` with a `SearchInfo` after each completed iteration
+        of later searches.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop calling a listener added with `add_listener()`."""
+        self.listeners.remove(listener)
+
+    def _report(self, depth, score, pv):
+        """Send the statistics of a completed iteration to the listeners."""
+        if not self.listeners:
+            return
+        elapsed = perf_counter() - self._start
+        info = SearchInfo(
+            depth, self.seldepth, score, self.nodes,
+            int(self.nodes / elapsed) if elapsed else 0, elapsed,
+            self.tt.hit_rate(), self.tt.usage(),
+            self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            pv, self.pvs_researches, self.aspiration_researches)
+        for listener in list(self.listeners):
+            listener(info)
+
+    def ponderhit(self):
+        """
+        Tell a search running with `ponder=True` in another thread that the
+        expected move was played: from now on it is searching for the move
+        to play. The time spent pondering counts towards its time limit, so
+        after a long ponder it stops at once with the deepest iteration that
+        completed.
+        """
+        if self.pondering:
+            if self._time_limit is not None:
+                self._deadline = self._start + self._time_limit
+            self.pondering = False
+
+    def stop(self):
+        """
+        Ask a search running in another thread to stop as soon as it next
+        checks the clock (once its first iteration is finished). It returns
+        the result of the deepest iteration that completed, as when its time
+        limit runs out.
+        """
+        self._deadline = 0.0
+
+    def search_move(self, game, move, depth, alpha=-INFINITY):
+        """
+        Search the integer root `move` of the position in `game` to `depth`
+        plies (the move itself counts as one) within the deadline set by
+        `prepare()`. Returns the score of the move from the point of view of
+        the player to move and its principal variation as integers, or
+        raises SearchTimeout. If `alpha` is given (the score of another root
+        move), a score at or below it is only an upper bound.
+        """
+        self._make(game, move)
+        try:
+            score = -self._negamax(game, depth - 1, -INFINITY, -alpha, 1)
+        finally:
+            self._unmake(game)
+        return score, [move] + self._pv[1]
+
+    def _negamax(self, game, depth, alpha, beta, ply, allow_null=True):
+        """
+        Return the score of the position in `game` searched to `depth`
+        plies, assuming the caller already has a line worth `alpha` and the
+        opponent already has one that holds us to `beta`. The best line
+        found is stored in `self._pv[ply]`. `allow_null` is False right
+        after a null move, so that two are never made in a row.
+        """
+        if depth <= 0:
+            return self._quiesce(game, alpha, beta, ply)
+
+        self.nodes += 1
+        self._pv[ply] = []
+        if ply > self.seldepth:
+            self.seldepth = ply
+        if self._deadline is not None and \
+                not self.nodes & (CHECK_INTERVAL - 1) and \
+                perf_counter() > self._deadline and self._interruptible:
+            raise SearchTimeout()
+
+        if ply > 0 and self._is_draw(game):
+            return 0
+
+        if ply >= MAX_PLY:
+            return self.evaluator.score(game)
+
+        key = game.hash
+        entry = self.tt.probe(key)
+        tt_move = 0
+        if entry is not None:
+            tt_move = entry.move
+            if ply > 0 and entry.depth >= depth:
+                score = _score_from_tt(entry.score, ply)
+                if entry.bound == EXACT or \
+                        entry.bound == LOWER and score >= beta or \
+                        entry.bound == UPPER and score <= alpha:
+                    return score
+
+        # only the nodes searched with a null window (which just need to
+        # prove a bound) are pruned
+        pv_node = beta - alpha > 1
+        in_check = game.in_check()
+        if self.null_move and allow_null and ply > 0 and not pv_node and \
+                not in_check and \
+                depth >= NULL_MOVE_MIN_DEPTH and beta < MATE - MAX_PLY and \
+                self.evaluator.score(game) >= beta and \
+                self._has_pieces(game):
+            reduction = NULL_MOVE_REDUCTION + (depth >= NULL_MOVE_DEEP)
+            game.push_null()
+            try:
+                score = -self._negamax(game, depth - 1 - reduction, -beta,
+                                       -beta + 1, ply + 1, False)
+            finally:
+                game.pop_null()
+            if score >= beta:
+                # a mate found after passing the turn is not a real one
+                return beta if score >= MATE - MAX_PLY else score
+
+        moves = game.get_moves(as_int=True)
+        if not moves:
+            return -MATE + ply if in_check else 0
+
+        # one or two plies from the horizon, quiet moves cannot raise alpha
+        # if even a generous margin over the static evaluation does not
+        futile = None
+        if self.futility and ply > 0 and not pv_node and not in_check and \
+                depth < len(FUTILITY_MARGINS) and \
+                abs(alpha) < MATE - MAX_PLY:
+            value = self.evaluator.score(game) + FUTILITY_MARGINS[depth]
+            if value <= alpha:
+                futile = value
+
+        if self.ordering:
+            moves = self.orderer.order(game, moves, ply, tt_move)
+        elif tt_move in moves:
+            # the best move found by an earlier search is likely still best
+            moves = [tt_move] + [m for m in moves if m != tt_move]
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = 0
+        killers = self.orderer.killers[ply]
+        for num, move in enumerate(moves):
+            quiet = num and self.orderer.is_quiet(game, move)
+            reducible = self.lmr and quiet and num >= LMR_MIN_MOVES and \
+                depth >= LMR_MIN_DEPTH and not in_check and \
+                move not in killers
+            self._make(game, move)
+            try:
+                # moves that give check are neither pruned nor reduced
+                if quiet and (futile is not None or reducible) and \
+                        game.in_check():
+                    quiet = reducible = False
+                if quiet and futile is not None:
+                    if futile > best:
+                        best = futile
+                    continue
+
+                reduction = 0
+                if reducible:
+                    reduction = 1 if num < LMR_LATE_MOVES else 2
+                    reduction = min(reduction, depth - 2)
+
+                # after the first move, only prove with a null window that
+                # the others are no better than alpha
+                null_window = num and self.pvs
+                low = -alpha - 1 if null_window else -beta
+                score = -self._negamax(game, depth - 1 - reduction, low,
+                                       -alpha, ply + 1)
+                if reduction and score > alpha:
+                    # the move looks better than expected: search it again
+                    # to the full depth
+                    score = -self._negamax(game, depth - 1, low, -alpha,
+                                           ply + 1)
+                if null_window and alpha < score < beta:
+                    # the move is better than alpha: search it again with
+                    # the full window for its exact score
+                    self.pvs_researches += 1
+                    score = -self._negamax(game, depth - 1, -beta, -alpha,
+                                           ply + 1)
+            finally:
+                self._unmake(game)
+
+            if score > best:
+                best = score
+                best_move = move
+                self._pv[ply] = [move] + self._pv[ply + 1]
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.cutoffs += 1
+                if not num:
+                    self.first_cutoffs += 1
+                if self.orderer.is_quiet(game, move):
+                    self.orderer.cutoff(game, move, depth, ply)
+                break
+
+        if best >= beta:
+            bound = LOWER
+        elif best > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, depth, _score_to_tt(best, ply), bound, best_move)
+        return best
+
+    def _quiesce(self, game, alpha, beta, ply):
+        """
+        Return the score of the position in `game` after searching only
+        captures and promotions, within the `alpha`-`beta` window. The
+        player to move may also decline to capture ("stand pat") and take
+        the static evaluation, so the score is never below it.
+        """
+        self.nodes += 1
+        self._pv[ply] = []
+        if ply > self.seldepth:
+            self.seldepth = ply
+        if self._deadline is not None and \
+                not self.nodes & (CHECK_INTERVAL - 1) and \
+                perf_counter() > self._deadline and self._interruptible:
+            raise SearchTimeout()
+
+        if ply > 0 and self._is_draw(game):
+            return 0
+
+        stand_pat = self.evaluator.score(game)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = self.orderer.order_captures(
+            game, game.get_captures(as_int=True))
+
+        best = stand_pat
+        for move in captures:
+            self._make(game, move)
+            try:
+                score = -self._quiesce(game, -beta, -alpha, ply + 1)
+            finally:
+                self._unmake(game)
+
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        return best
+
+    def _make(self, game, move):
+        """Make `move` in `game` and update the evaluation to match."""
+        self.evaluator.push(game, move)
+        game.push(move, validate=False)
+
+    def _unmake(self, game):
+        """Take back the last move made with `_make()`."""
+        game.pop()
+        self.evaluator.pop()
+
+    @staticmethod
+    def _has_pieces(game):
+        """
+        Return True if the player to move has a piece other than the king
+        and pawns, so that passing the turn is very unlikely to be its best
+        option (zugzwang).
+        """
+        find_piece = game.board.find_piece
+        pieces = 'NBRQ' if game.state.player == 'w' else 'nbrq'
+        return any(find_piece(symbol) >= 0 for symbol in pieces)
+
+    @staticmethod
+    def _is_draw(game):
+        """
+        Return True if the position is drawn by the fifty-move rule or
+        repeats a position since the last capture or pawn move.
+        """
+        halfmoves = game.state.ply
+        if halfmoves >= 100:
+            return True
+
+        keys = game.key_history
+        key = game.hash
+        last = len(keys) - 1
+        for idx in range(last - 2, max(last - halfmoves, 0) - 1, -2):
+            if keys[idx] == key:
+                return True
+        return False
+
+
+def _score_to_tt(score, ply):
+    """
+    Convert a mate score relative to the root into one relative to the
+    current node, so that the stored entry is valid at any ply.
+    """
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    """Convert a stored mate score back to one relative to the root."""
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
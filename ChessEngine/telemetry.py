@@ -0,0 +1,53 @@
+"""
+Search telemetry. Every iteration of a search produces a
+`ChessEngine.search.SearchInfo` with its depth, node count, speed,
+transposition table statistics, move ordering quality and principal
+variation, which is passed to the listeners of the search.
+
+`JsonLinesLog` is a listener that appends each `SearchInfo` as one JSON
+object per line, so that searches can be analyzed later (e.g., to tune the
+time management or size the transposition table):
+
+    from ChessEngine import Search
+    from ChessEngine.telemetry import JsonLinesLog
+
+    engine = Search()
+    with JsonLinesLog('search.jsonl') as log:
+        engine.add_listener(log)
+        engine.search(game, time_limit=5)
+"""
+
+import json
+import time
+
+
+class JsonLinesLog(object):
+    """
+    This class writes each `SearchInfo` it is called with as a line of
+    JSON to `file`, either a path (opened for appending) or an open text
+    file. Each line also records the wall-clock time it was written at, and
+    any `fields` given (e.g., the name of the engine or of the position).
+    """
+
+    def __init__(self, file, **fields):
+        self._owner = isinstance(file, str)
+        self.file = open(file, 'a') if self._owner else file
+        self.fields = fields
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __call__(self, info):
+        record = dict(self.fields)
+        record['timestamp'] = time.time()
+        record.update(info._asdict())
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        """Close the log file, if it was opened from a path."""
+        if self._owner and not self.file.closed:
+            self.file.close()
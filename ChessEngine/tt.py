@@ -0,0 +1,240 @@
+"""
+Fixed-memory transposition table for the search. Positions reached by
+different move orders share a Zobrist hash, so a result stored the first
+time a position is searched can be reused when it is reached again.
+
+The table is a pair of preallocated `array('Q')` columns (keys and packed
+entry data) sized in megabytes, so its memory use does not grow during a
+game. Entries are grouped in buckets of two slots: the first slot keeps the
+deepest result seen for its bucket (depth-preferred), and the second is
+always overwritten with the newest result (always-replace).
+
+With `shared=True` the two columns live in a `multiprocessing.shared_memory`
+block instead, which other processes open with `TranspositionTable.attach()`
+so that search workers see each other's results. The processes read and
+write entries without locks: the key column holds the position hash XORed
+with the data word, so an entry whose two words were written by different
+processes at the same time no longer matches its hash and is ignored.
+
+The data word of each entry is laid out as:
+
+    bits  0-15  best move (a 16-bit move from Chessnut.encoding)
+    bits 16-23  depth searched
+    bits 24-25  bound: EXACT, LOWER or UPPER
+    bits 26-31  search generation the entry was stored in
+    bits 32-63  score plus SCORE_OFFSET (so that it is never negative)
+"""
+
+from array import array
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+# The score is exact, a lower bound (the search failed high), or an upper
+# bound (the search failed low)
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+SCORE_OFFSET = 1 << 31
+GENERATIONS = 64
+
+# Bytes used by each slot: one 64-bit key and one 64-bit data word
+ENTRY_SIZE = 16
+BUCKET_SIZE = 2
+
+# Number of buckets sampled by `usage()`
+USAGE_SAMPLE = 1000
+
+# Best move (as an integer, 0 if none), depth, score and bound of a stored
+# search result
+TTEntry = namedtuple('TTEntry', ['move', 'depth', 'score', 'bound'])
+
+
+class TranspositionTable(object):
+    """
+    This class stores search results by position hash in a fixed amount of
+    memory. `probe()` returns the stored `TTEntry` for a hash (or None), and
+    `store()` records a new result, replacing older ones as needed. The
+    table counts its probes and hits so that `hit_rate()` and `usage()` can
+    be used to choose its size.
+
+    If `shared` is True, the table is allocated in shared memory, and its
+    `name` can be passed to `TranspositionTable.attach()` in other
+    processes. The process that created it should call `close()` when done,
+    which frees the block.
+    """
+
+    def __init__(self, size_mb=16, shared=False):
+        self._shm = None
+        self._owner = False
+        self.name = None
+        self.resize(size_mb, shared)
+
+    @classmethod
+    def attach(cls, name, size_mb):
+        """
+        Open the shared table `name` (of `size_mb` megabytes) created by
+        another process. The process should be started by the creating
+        process (e.g., as a pool worker), so that both register the block
+        with the same resource tracker and it is freed only once.
+        """
+        table = cls.__new__(cls)
+        table._open(shared_memory.SharedMemory(name=name), size_mb, False)
+        return table
+
+    def resize(self, size_mb, shared=False):
+        """
+        Reallocate the table to use about `size_mb` megabytes, discarding
+        its contents.
+        """
+        if size_mb <= 0:
+            raise ValueError("Transposition table size must be positive: "
+                             "{}".format(size_mb))
+        self.close()
+        if shared:
+            shm = shared_memory.SharedMemory(create=True,
+                                             size=_table_bytes(size_mb))
+            self._open(shm, size_mb, True)
+            return
+
+        column = bytes(_table_bytes(size_mb) // 2)
+        self._set_columns(size_mb, array('Q', column), array('Q', column))
+
+    def _open(self, shm, size_mb, owner):
+        """
+        Use the shared memory block `shm` for the columns: the keys in its
+        first half, and the data words in its second half.
+        """
+        self._shm = shm
+        self._owner = owner
+        self.name = shm.name
+        size = _table_bytes(size_mb)
+        self._set_columns(size_mb, shm.buf[:size // 2].cast('Q'),
+                          shm.buf[size // 2:size].cast('Q'))
+
+    def _set_columns(self, size_mb, keys, data):
+        """
+        Use `keys` and `data` (arrays or memoryviews of 64-bit words) as the
+        columns of the table.
+        """
+        self.size_mb = size_mb
+        self.buckets = _buckets(size_mb)
+        self._keys = keys
+        self._data = data
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def close(self):
+        """
+        Release a shared table; the process that created it also frees the
+        memory block. Other processes must not use the table afterwards.
+        """
+        if self._shm is None:
+            return
+        self._keys.release()
+        self._data.release()
+        self._keys = self._data = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+    def clear(self):
+        """Empty the table and reset its statistics."""
+        if self._shm is not None:
+            size = _table_bytes(self.size_mb)
+            self._shm.buf[:size] = bytes(size)
+            self._set_columns(self.size_mb, self._keys, self._data)
+        else:
+            self.resize(self.size_mb)
+
+    def new_search(self):
+        """
+        Start a new search generation, so that entries left from earlier
+        searches can be replaced by shallower new ones.
+        """
+        self.generation = (self.generation + 1) % GENERATIONS
+
+    def probe(self, key):
+        """
+        Return the `TTEntry` stored for the position hash `key`, or None if
+        the table has no entry for it.
+        """
+        self.probes += 1
+        slot = key % self.buckets * BUCKET_SIZE
+        data = self._data[slot]
+        if self._keys[slot] ^ data != key or not data:
+            slot += 1
+            data = self._data[slot]
+            if self._keys[slot] ^ data != key or not data:
+                return None
+
+        self.hits += 1
+        return TTEntry(data & 0xFFFF, data >> 16 & 0xFF,
+                       (data >> 32) - SCORE_OFFSET, data >> 24 & 3)
+
+    def store(self, key, depth, score, bound, move=0):
+        """
+        Record the result of searching the position hash `key` to `depth`
+        plies. The depth-preferred slot of the bucket is used if it holds
+        the same position, a shallower result, or a result from an earlier
+        search; otherwise the always-replace slot is overwritten.
+        """
+        self.stores += 1
+        slot = key % self.buckets * BUCKET_SIZE
+        keys = self._keys
+        data = self._data
+
+        old = data[slot]
+        if old and keys[slot] ^ old != key and \
+                depth < old >> 16 & 0xFF and \
+                old >> 26 & (GENERATIONS - 1) == self.generation:
+            slot += 1
+            old = data[slot]
+        if not move and keys[slot] ^ old == key:
+            # keep the best move of an earlier search of the position
+            move = old & 0xFFFF
+
+        word = (move | min(depth, 0xFF) << 16 | bound << 24 |
+                self.generation << 26 | (score + SCORE_OFFSET) << 32)
+        keys[slot] = key ^ word
+        data[slot] = word
+
+    def hit_rate(self):
+        """Return the fraction of probes that found an entry."""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self):
+        """
+        Return the fraction of slots holding an entry from the current
+        search, estimated from the first buckets of the table.
+        """
+        data = self._data
+        count = min(self.buckets, USAGE_SAMPLE) * BUCKET_SIZE
+        used = sum(1 for slot in range(count) if data[slot] and
+                   data[slot] >> 26 & (GENERATIONS - 1) == self.generation)
+        return used / count
+
+    def reset_stats(self):
+        """Reset the probe, hit and store counters."""
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def memory(self):
+        """Number of bytes allocated for the table."""
+        return (self._keys.itemsize * len(self._keys) +
+                self._data.itemsize * len(self._data))
+
+
+def _buckets(size_mb):
+    """Return the number of buckets that fit in `size_mb` megabytes."""
+    return max(int(size_mb * 1024 * 1024) // (ENTRY_SIZE * BUCKET_SIZE), 1)
+
+
+def _table_bytes(size_mb):
+    """Return the bytes used by both columns of a table of `size_mb` MB."""
+    return _buckets(size_mb) * BUCKET_SIZE * ENTRY_SIZE
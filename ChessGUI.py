@@ -1,10 +1,12 @@
+import argparse
 import pygame
 import sys
 import os
+import threading
 from pygame import mixer
 from Chessnut import Game
 from ChessBoard import ChessBoard
-from ChessGame import select_ai_move, current_player
+from ChessGame import Engine, copy_position, current_player
 
 # Initialize pygame
 pygame.init()
@@ -30,6 +32,9 @@ PANEL_BG = (221, 221, 221)
 BUTTON_COLOR = (120, 120, 120)
 BUTTON_HOVER = (150, 150, 150)
 
+# Event posted by the AI worker thread when it has chosen a move
+AI_MOVE_EVENT = pygame.USEREVENT + 1
+
 # Initialize screen
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Chess Game")
@@ -190,12 +195,22 @@ class Button:
         return False
 
 class ChessGUI:
-    def __init__(self):
+    def __init__(self, workers=1):
         self.board_offset_x = 20
         self.board_offset_y = 20
         self.board = ChessBoard(8, 8)
-        self.game = Game()
+        self.game = Game(history='compact')
         self.board.updateBoard(str(self.game))
+        # AI player with its own search tables, split across `workers` processes
+        self.engine = Engine(self.game, workers=workers)
+        self.ai_thread = None  # Worker thread searching for the AI move
+        self.ai_request = 0  # Id of the latest AI search; older results are ignored
+        self.ponder = False  # Let the AI search on the human's time
+        self.ponder_move = None  # Human move the AI expects while it ponders
+        self.ponder_result = None  # Move found by a ponder search that ended early
+        self.show_engine_stats = False  # Show the AI's search statistics
+        self.engine_info = None  # Statistics of the AI's last search iteration
+        self.engine.add_listener(self.record_engine_info)
         
         self.selected_piece = None
         self.selected_square = None
@@ -210,6 +225,7 @@ class ChessGUI:
         self.board_flipped = False
         self.game_over = False
         self.player_timers = {"White": 600, "Black": 600}  # 10 minutes per player
+        self.increment = 0  # Seconds added to the clock after each move
         self.timer_active = False
         self.current_time = 0
         self.timer_running = False
@@ -230,7 +246,8 @@ class ChessGUI:
     
     def new_game(self):
         """Start a new chess game"""
-        self.game = Game()
+        self.cancel_ai_move()
+        self.game = Game(history='compact')
         self.board.updateBoard(str(self.game))
         self.move_history = []
         self.selected_piece = None
@@ -278,6 +295,7 @@ class ChessGUI:
             with open("saved_game.txt", "r") as f:
                 lines = f.readlines()
                 if len(lines) >= 5:
+                    self.cancel_ai_move()
                     fen = lines[0].strip()
                     self.difficulty = lines[1].strip()
                     self.difficulty_btn.text = f"Difficulty: {['Easy', 'Medium', 'Hard'][int(self.difficulty)-1]}"
@@ -313,6 +331,17 @@ class ChessGUI:
         self.toggle_mode_btn.text = "vs Human" if self.human_vs_human else "vs Computer"
         self.new_game()
     
+    def toggle_ponder(self):
+        """Toggle searching on the human's time against the computer"""
+        self.ponder = not self.ponder
+        if not self.ponder and self.ponder_move is not None:
+            self.cancel_ai_move()
+        print(f"Pondering {'on' if self.ponder else 'off'}")
+    
+    def record_engine_info(self, info):
+        """Keep the latest search statistics (called on the AI worker thread)"""
+        self.engine_info = info
+    
     def update_captured_pieces(self):
         """Update the lists of captured pieces based on what's missing from the board"""
         # This is a simplified implementation - you might want to track captures as they happen
@@ -422,8 +451,8 @@ class ChessGUI:
             if (current == 'w' and piece.islower()) or (current == 'b' and piece.isupper()):
                 return
                 
-        # Computer's turn in AI mode
-        if not self.human_vs_human and current == 'b':
+        # Computer's turn in AI mode (or the computer is still thinking)
+        if not self.human_vs_human and (current == 'b' or self.ai_thinking()):
             return
             
         # If a piece is already selected
@@ -503,7 +532,12 @@ class ChessGUI:
                     check_sound.play()
                 except:
                     pass
-            
+
+            # Stop pondering on a reply that wasn't played (and any search once
+            # the game is over), as make_ai_move won't be called to stop it
+            if self.game_over or (self.ponder_move is not None and move != self.ponder_move):
+                self.cancel_ai_move()
+
             # Reset selection
             self.selected_piece = None
             self.valid_moves = []
@@ -513,15 +547,107 @@ class ChessGUI:
                 self.make_ai_move()
     
     def make_ai_move(self):
-        """Have the AI make a move"""
-        ai_move = select_ai_move(self.difficulty)
+        """Start searching for the AI move on a worker thread"""
+        if self.ponder_move is not None and self.ponder_move == self.last_move \
+                and self.difficulty == "3":
+            self.ponder_hit()
+            return
+        self.cancel_ai_move()  # Also stops pondering on a move that wasn't played
+        self.ai_request += 1
+        # The worker gets its own copy of the position, so the game can be
+        # drawn (or replaced) while the engine thinks
+        args = (self.ai_request, copy_position(self.game), self.difficulty,
+                self.player_timers["Black"], self.increment)
+        self.ai_thread = threading.Thread(target=self.search_ai_move, args=args,
+                                          daemon=True)
+        self.ai_thread.start()
+
+    def search_ai_move(self, request, position, difficulty, time_left, increment):
+        """Select the AI move (on the worker thread) and post it back to the event loop"""
+        ai_move = self.engine.select_move(position, difficulty, time_left=time_left,
+                                          increment=increment)
+        pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, request=request,
+                                             move=ai_move))
+
+    def start_pondering(self):
+        """Search the position after the human's expected reply while the human thinks"""
+        if not self.ponder or self.human_vs_human or self.game_over or \
+                self.difficulty != "3" or not self.engine.can_ponder():
+            return
+        expected = self.engine.expected_reply()
+        if expected not in self.game.get_moves():
+            return
+        position = copy_position(self.game)
+        position.apply_move(expected)
+        self.ai_request += 1
+        self.ponder_move = expected
+        self.ponder_result = None
+        args = (self.ai_request, position, self.player_timers["Black"], self.increment)
+        self.ai_thread = threading.Thread(target=self.ponder_ai_move, args=args,
+                                          daemon=True)
+        self.ai_thread.start()
+
+    def ponder_ai_move(self, request, position, time_left, increment):
+        """Ponder (on the worker thread) and post the move back to the event loop"""
+        ai_move = self.engine.ponder(position, time_left, increment=increment)
+        pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, request=request,
+                                             move=ai_move))
+
+    def ponder_hit(self):
+        """The human played the expected move: the ponder search becomes the AI's search"""
+        self.ponder_move = None
+        # The search may still be starting on the worker; wait for it, so
+        # that its clock is started rather than reset
+        thread = self.ai_thread
+        while thread is not None and thread.is_alive() and not self.engine.pondering():
+            thread.join(0.001)
+        self.engine.ponderhit()
+        if self.ponder_result is not None:
+            # The ponder search already finished (e.g., it found a mate)
+            ai_move = self.ponder_result
+            self.ponder_result = None
+            self.play_ai_move(ai_move)
+
+    def handle_ai_move(self, event):
+        """Play the move posted by the AI worker, unless it is out of date"""
+        if event.request != self.ai_request:
+            return  # Searched for a game that has since been replaced
+        if self.ponder_move is not None:
+            # A ponder search ended before the human moved; keep its move
+            # in case the expected reply is played
+            self.ponder_result = event.move
+            return
+        self.play_ai_move(event.move)
+
+    def play_ai_move(self, ai_move):
+        """Play the move chosen by the AI and start pondering on the reply"""
+        self.ai_thread = None
         if ai_move:
-            # Slight delay to make it seem like the AI is thinking
-            pygame.time.delay(500)
             print(f"AI is making move: {ai_move}")
             self.make_move(ai_move)
+            self.start_pondering()
         else:
             print("AI couldn't find a valid move")
+
+    def ai_thinking(self):
+        """Return True while the AI worker is searching for its move (not pondering)"""
+        return self.ponder_move is None and self.ai_thread is not None and \
+            self.ai_thread.is_alive()
+
+    def cancel_ai_move(self):
+        """Stop the AI worker, if any, and discard the move it would post"""
+        self.ai_request += 1
+        self.ponder_move = None
+        self.ponder_result = None
+        thread = self.ai_thread
+        self.ai_thread = None
+        if thread is None:
+            return
+        # The search may not have started yet when asked to stop, so keep
+        # asking until the thread exits
+        while thread.is_alive():
+            self.engine.stop()
+            thread.join(0.01)
     
     def draw_board(self):
         """Draw the chess board"""
@@ -637,7 +763,9 @@ class ChessGUI:
         pygame.draw.rect(screen, PANEL_BG, (BOARD_SIZE + 40, 0, SCREEN_WIDTH - BOARD_SIZE - 40, SCREEN_HEIGHT))
         
         # Current player and status
-        player_text = f"Current Player: {current_player()}"
+        player_text = f"Current Player: {current_player(self.game)}"
+        if self.ai_thinking():
+            player_text += " (thinking...)"
         status_text = "Game Status: "
         
         if self.game_status == 0:
@@ -717,6 +845,34 @@ class ChessGUI:
         
         screen.blit(white_timer_text, (550, 600))
         screen.blit(black_timer_text, (700, 600))
+        
+        if self.show_engine_stats:
+            self.draw_engine_stats()
+    
+    def draw_engine_stats(self):
+        """Draw the statistics of the AI's last search iteration below the board"""
+        y = self.board_offset_y + BOARD_SIZE + 10
+        pygame.draw.rect(screen, PANEL_BG, (self.board_offset_x, y, BOARD_SIZE, SCREEN_HEIGHT - y - 10))
+        
+        info = self.engine_info
+        if info is None:
+            lines = ["Engine: no search yet (Hard difficulty)"]
+        else:
+            def percent(value):
+                return "-" if value is None else f"{value:.0%}"
+            seldepth = "-" if info.seldepth is None else info.seldepth
+            lines = [
+                f"Depth {info.depth}/{seldepth}   Score {info.score / 100:+.2f}   "
+                f"Nodes {info.nodes:,}   {info.nps:,} nps   {info.time:.1f} s",
+                f"TT hits {percent(info.tt_hit_rate)}   TT fill {percent(info.tt_fill)}   "
+                f"First-move cutoffs {percent(info.first_cutoff_rate)}",
+                f"Re-searches: PVS {'-' if info.pvs_researches is None else info.pvs_researches}   "
+                f"Aspiration {'-' if info.aspiration_researches is None else info.aspiration_researches}",
+                "PV: " + " ".join(info.pv[:10]),
+            ]
+        for i, line in enumerate(lines):
+            text = font.render(line, True, TEXT_COLOR)
+            screen.blit(text, (self.board_offset_x + 10, y + 8 + i * 22))
     
     def format_time(self, seconds):
         """Format seconds to MM:SS"""
@@ -800,6 +956,10 @@ class ChessGUI:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+
+                # The AI worker has chosen its move
+                elif event.type == AI_MOVE_EVENT:
+                    self.handle_ai_move(event)
                 
                 # Handle key presses
                 elif event.type == pygame.KEYDOWN:
@@ -811,6 +971,10 @@ class ChessGUI:
                         self.save_game()
                     elif event.key == pygame.K_l:
                         self.load_game()
+                    elif event.key == pygame.K_p:
+                        self.toggle_ponder()
+                    elif event.key == pygame.K_i:
+                        self.show_engine_stats = not self.show_engine_stats
                         
                 # Handle mouse clicks
                 elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -828,11 +992,18 @@ class ChessGUI:
             # Draw everything
             self.draw()
             
+        self.cancel_ai_move()
+        self.engine.close()
         pygame.quit()
         sys.exit()
 
-def main():
+def main(argv=None):
     """Main function to start the chess GUI"""
+    parser = argparse.ArgumentParser(description="Play chess against the computer")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes the Hard AI searches with (pondering needs 1)")
+    args = parser.parse_args(argv)
+
     # Check and create directories for assets
     os.makedirs("sounds", exist_ok=True)
     os.makedirs("pieces", exist_ok=True)
@@ -911,7 +1082,7 @@ def main():
             print(f"Error saving image for {piece}: {e}")
     
     # Start the game
-    gui = ChessGUI()
+    gui = ChessGUI(workers=args.workers)
     gui.run()
 
 if __name__ == "__main__":
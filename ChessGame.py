@@ -1,26 +1,16 @@
 from Chessnut import Game
 from ChessBoard import *
+from ChessEngine import Search, ParallelSearch, time_budget
 import random
-from Node import Node
 
 # This program simulates a chess game with ChessNut library, integrating a GUI and an intelligent chess agent.
 
-# Global variables
-board = ChessBoard(8, 8)
-chess_game = Game()  # New chess game instance
-player_next_moves = {}  # Stores next two moves for the human player
-ai_next_moves = {}  # Stores next two moves for the AI
-board.updateBoard(str(chess_game))
 # Piece values for scoring
 piece_values = {'p': 1, 'b': 3, 'n': 3, 'r': 5, 'q': 9, 'k': 0}
 
-# Scores for each player
-white_score = 0
-black_score = 0
-
 # Checks and prints the game status like check, checkmate, or stalemate
-def check_game_status():
-    match chess_game.status:
+def check_game_status(game):
+    match game.status:
         case 1:
             print("CHECK")
         case 2:
@@ -29,147 +19,163 @@ def check_game_status():
         case 3:
             print("STALEMATE")
 
-# Returns the current player ('White' or 'Black')
-def current_player():
-    return "White" if chess_game.state[0] == 'w' else "Black"
-
-# Minimax algorithm for chess AI decision making
-def minimax(node, depth, is_maximizing_player):
-    if depth == 0 or node.leaf:
-        heuristic_value = find_best_move('b')
-        return heuristic_value
-
-    if is_maximizing_player:
-        best_value = -float('inf')
-        for child in node.children:
-            value = minimax(Node(child), depth - 1, False)
-            best_value = max(best_value, value)
-    else:
-        best_value = float('inf')
-        for child in node.children:
-            value = minimax(Node(child), depth - 1, True)
-            best_value = min(best_value, value)
-
-    return best_value
-
-# Heuristic to evaluate the best move based on piece values
-def find_best_move(player):
-    possible_moves = chess_game.get_moves(player)
-    piece_values = {'p': 1, 'b': 3, 'n': 3, 'r': 5, 'q': 9, 'k': 200, ' ': 0}
-    moves_score = {}
-
-    for move in possible_moves:
-        target_square = move[2:]
-        piece = board.lookupPiece(target_square).lower()
-        moves_score[move] = piece_values[piece]
-
-    max_value = max(moves_score.values())
-    best_moves = [move for move, value in moves_score.items() if value == max_value]
-    return random.choice(best_moves)
-
-# Generates potential future moves based on current board state
-def predict_future_moves(player):
-    future_moves = {}
-    current_fen = chess_game.get_fen()
-
-    for move in chess_game.get_moves(player):
-        chess_game.apply_move(move)
-        future_moves[move] = chess_game.get_moves(player)
-        chess_game.set_fen(current_fen)
-
-    return future_moves
-
-# Selects an AI move based on difficulty chosen by user
-def select_ai_move(difficulty):
-    match difficulty:
-        case "1":
-            return random_move()
-        case "2":
-            return best_move()
-        case "3":
-            return minimax_move()
-
-# Runs the chess game loop, handling user interactions and AI moves
-def run_game():
-    print("\nWelcome to Chess AI!")
-    print('Player is white, AI is black')
-    print('Instructions: Enter move in the format "e2e4" for moving a piece from e2 to e4.')
-
-    difficulty = input("Choose AI difficulty (1: Easy, 2: Medium, 3: Hard): ")
-    while difficulty not in ["1", "2", "3"]:
-        difficulty = input("Invalid choice. Select 1, 2, or 3 for AI difficulty: ")
-
-    while chess_game.status not in [2, 3]:  # Continue playing unless checkmate or stalemate
-        print(f"\n{current_player()} to move.")
-        move = input("Your move: ")
-        if move in chess_game.get_moves('w'):
-            chess_game.apply_move(move)
-            board.updateBoard(str(chess_game))
-            print("Board updated.")
-            check_game_status()
-            ai_move = select_ai_move(difficulty)
-            chess_game.apply_move(ai_move)
-            board.updateBoard(str(chess_game))
-            print(f"AI moved {ai_move}.")
-            check_game_status()
+# Returns the player to move in a position ('White' or 'Black')
+def current_player(game):
+    return "White" if game.state[0] == 'w' else "Black"
+
+# Copies a position (a Game or a FEN string) into a new Game, keeping the
+# position keys since the last capture or pawn move so that the search still
+# sees repetition draws
+def copy_position(position):
+    if isinstance(position, str):
+        return Game(position)
+    game = Game(position.get_fen(), history='compact')
+    game.key_history = position.key_history[-(position.state.ply + 1):]
+    return game
+
+# An AI player with its own copy of the position, its own board and its own
+# search tables, so that any number of engines can play independent games in
+# one process
+class Engine:
+    def __init__(self, position=None, workers=1, tt_size=16):
+        self.game = copy_position(position or Game())
+        self.board = ChessBoard(8, 8)
+        self.board.updateBoard(str(self.game))
+        # Alpha-beta search for hard difficulty; with more than one worker
+        # the search is split across that many processes
+        if workers <= 1:
+            self.search = Search(tt_size=tt_size)
         else:
-            print("Invalid move. Try again.")
-# Heuristic function to evaluate the best move based on piece values
-def find_best_move(player):
-    possible_moves = chess_game.get_moves(player)
-    piece_values = {'p': 1, 'b': 3, 'n': 3, 'r': 5, 'q': 9, 'k': 200, ' ': 0}
-    moves_score = {}
-
-    for move in possible_moves:
-        target_square = move[2:]  # 'e4' from 'e2e4'
-        piece = board.lookupPiece(target_square).lower()  # gets the piece at the target location
-        moves_score[move] = piece_values[piece]  # assigns score based on piece value
-
-    # Find the best moves by scoring
-    max_value = max(moves_score.values(), default=0)  # Find max score, default to 0 if no moves
-    best_moves = [move for move, value in moves_score.items() if value == max_value]
-    return random.choice(best_moves) if best_moves else None  # Choose randomly among best moves
-
-# Generates potential future moves for two layers deep (2-ply lookahead)
-def predict_future_moves(player):
-    future_moves = {}
-    current_fen = chess_game.get_fen()
-
-    # First layer of moves
-    for move in chess_game.get_moves(player):
-        chess_game.apply_move(move)
-        # Second layer of moves based on the first move
-        future_moves[move] = chess_game.get_moves(player)
-        chess_game.set_fen(current_fen)  # Reset to original position
-
-    return future_moves
-
-# Selects an AI move based on the user-selected difficulty
-def select_ai_move(difficulty):
-    match difficulty:
-        case "1":
-            return random_move()
-        case "2":
-            return best_move()
-        case "3":
-            return minimax_move()
-
-# Random move AI for easy difficulty
-def random_move():
-    possible_moves = chess_game.get_moves('b')
-    return random.choice(possible_moves) if possible_moves else None
-
-# Best move AI for medium difficulty
-def best_move():
-    return find_best_move('b')
-
-# Minimax AI for hard difficulty
-def minimax_move():
-    root_node = Node(chess_game.get_fen())  # Create root node for current position
-    return minimax(root_node, 2, True)  # Start minimax with depth 2 and maximizing true
+            self.search = ParallelSearch(workers, tt_size=tt_size)
+        self.last_result = None  # Result of the last alpha-beta search
+
+    # Replaces the engine's position with a copy of the given one
+    def set_position(self, position):
+        self.game = copy_position(position)
+        self.board.updateBoard(str(self.game))
+
+    # Selects a move for the player to move in the position, based on the
+    # difficulty chosen by the user
+    def select_move(self, position, difficulty, time_left=None, increment=0):
+        self.set_position(position)
+        self.last_result = None
+        match difficulty:
+            case "1":
+                return self.random_move()
+            case "2":
+                return self.best_move()
+            case "3":
+                return self.minimax_move(time_left=time_left, increment=increment)
+
+    # Random move AI for easy difficulty
+    def random_move(self):
+        possible_moves = self.game.get_moves()
+        return random.choice(possible_moves) if possible_moves else None
+
+    # Best move AI for medium difficulty
+    def best_move(self):
+        return self.find_best_move(self.game.state.player)
+
+    # Heuristic function to evaluate the best move based on piece values
+    def find_best_move(self, player):
+        possible_moves = self.game.get_moves(player)
+        piece_values = {'p': 1, 'b': 3, 'n': 3, 'r': 5, 'q': 9, 'k': 200, ' ': 0}
+        moves_score = {}
+
+        for move in possible_moves:
+            target_square = move[2:4]  # 'e4' from 'e2e4'
+            piece = self.board.lookupPiece(target_square).lower()  # gets the piece at the target location
+            moves_score[move] = piece_values[piece]  # assigns score based on piece value
+
+        # Find the best moves by scoring
+        max_value = max(moves_score.values(), default=0)  # Find max score, default to 0 if no moves
+        best_moves = [move for move, value in moves_score.items() if value == max_value]
+        return random.choice(best_moves) if best_moves else None  # Choose randomly among best moves
+
+    # Generates potential future moves for two layers deep (2-ply lookahead)
+    def predict_future_moves(self, player):
+        future_moves = {}
+
+        # First layer of moves
+        for move in self.game.get_moves(player):
+            self.game.push(move)
+            # Second layer of moves based on the first move
+            future_moves[move] = self.game.get_moves(player)
+            self.game.pop()  # Take the move back to restore the original position
+
+        return future_moves
+
+    def minimax_move(self, depth=3, time_left=None, increment=0):
+        if time_left is None:
+            result = self.search.search(self.game, depth)  # Fixed depth without a clock
+        else:
+            # Deepen until the share of the remaining clock for this move runs out
+            limit = time_budget(time_left, increment)
+            result = self.search.search(self.game, time_limit=limit)
+        self.last_result = result
+        return result.move
+
+    # Returns the reply the last alpha-beta search expects from the opponent
+    # (the second move of its principal variation), or None
+    def expected_reply(self):
+        if self.last_result is None or len(self.last_result.pv) < 2:
+            return None
+        return self.last_result.pv[1]
+
+    # Returns True if the engine can search on the opponent's time; only the
+    # single-process search can have its clock started mid-search
+    def can_ponder(self):
+        return isinstance(self.search, Search)
+
+    # Searches the position after the expected reply while the opponent
+    # thinks, until ponderhit() or stop() is called from another thread,
+    # and returns the move to play. The time for the move (from time_left and
+    # increment) is counted from the start of pondering, but only enforced
+    # after ponderhit().
+    def ponder(self, position, time_left, increment=0):
+        self.set_position(position)
+        limit = time_budget(time_left, increment)
+        result = self.search.search(self.game, time_limit=limit, ponder=True)
+        self.last_result = result
+        return result.move
+
+    # Returns True while a ponder search is waiting for ponderhit()
+    def pondering(self):
+        return self.can_ponder() and self.search.pondering
+
+    # Tells a ponder search that the expected reply was played, so that it
+    # continues as the search for the engine's move
+    def ponderhit(self):
+        self.search.ponderhit()
+
+    # Calls listener with a SearchInfo after each iteration of the engine's
+    # alpha-beta searches (from the thread running the search)
+    def add_listener(self, listener):
+        self.search.add_listener(listener)
+
+    # Asks a search running in another thread to return early; its move
+    # should be discarded
+    def stop(self):
+        self.search.stop()
+
+    # Stops the worker processes of a parallel search
+    def close(self):
+        if isinstance(self.search, ParallelSearch):
+            self.search.close()
+
+# Selects an AI move for the given position based on the user-selected
+# difficulty. Pass an engine to reuse its search tables between moves.
+def select_ai_move(position, difficulty, time_left=None, increment=0, engine=None):
+    engine = engine or Engine(position)
+    return engine.select_move(position, difficulty, time_left=time_left, increment=increment)
 
 # Main game loop to run the chess game
 def run_game():
+    game = Game(history='compact')
+    engine = Engine(game)
+    board = ChessBoard(8, 8)
+    board.updateBoard(str(game))
+
     print("\nWelcome to Chess AI!")
     print('Player is white (capital letters), AI is black (lowercase letters)')
     print('Instructions: Enter moves in standard chess notation (e.g., "e2 to e4").')
@@ -177,24 +183,26 @@ def run_game():
     difficulty = input("Choose AI difficulty (1: Easy, 2: Medium, 3: Hard): ")
     while difficulty not in ["1", "2", "3"]:
         difficulty = input("Invalid choice. Please enter 1, 2, or 3 for AI difficulty: ")
-    while chess_game.status not in [2, 3]:  # Game continues unless there's checkmate or stalemate
+    while game.status not in [2, 3]:  # Game continues unless there's checkmate or stalemate
         print(board)
-        print(f"\n{current_player()} to move.")
+        print(f"\n{current_player(game)} to move.")
         move = input("Your move: ")
-        if move in chess_game.get_moves('w'):
-            chess_game.apply_move(move)
-            board.updateBoard(str(chess_game))
+        if move in game.get_moves('w'):
+            game.apply_move(move)
+            board.updateBoard(str(game))
             print("Board updated.")
-            check_game_status()
-            ai_move = select_ai_move(difficulty)
-            chess_game.apply_move(ai_move)
-            board.updateBoard(str(chess_game))
+            check_game_status(game)
+            if game.status in [2, 3]:
+                break
+            ai_move = engine.select_move(game, difficulty)
+            game.apply_move(ai_move)
+            board.updateBoard(str(game))
             print(f"AI moved: {ai_move}.")
-            check_game_status()
+            check_game_status(game)
             print(board)
         else:
             print("Invalid move. Please try again.")
-            print(f"Valid moves are: {chess_game.get_moves('w')}")
+            print(f"Valid moves are: {game.get_moves('w')}")
 
 
 # Only run the game if this file is executed directly
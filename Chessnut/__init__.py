@@ -26,6 +26,24 @@ To use Chessnut, import the Game class from the module:
     chessgame.apply_move('e2e4')  # Advance the pawn from e2 to e4
 
     chessgame.apply_move('e2e4')  # raise InvalidMove (no piece on e2)
+
+    chessgame.push('e7e5')  # Make a move in place, without building a FEN
+
+    chessgame.pop()  # Take it back again
+
+    chessgame.push_null()  # Pass the turn (for null move pruning)
+
+    chessgame.pop_null()  # Take the null move back
+
+    chessgame.get_moves(as_int=True)  # Moves as 16-bit integers (see encoding)
+
+    chessgame.get_captures()  # Only the legal captures and promotions
+
+The board is stored as a list of piece symbols by default; pass
+`backend='bitboard'` to store it as piece bitboards with occupancy masks
+instead:
+
+    chessgame = Game(backend='bitboard')
 """
 
 # import module functions and promote into the package namespace
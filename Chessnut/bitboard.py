@@ -0,0 +1,224 @@
+"""
+The bitboard module implements an alternative board backend, `BitBoard`, that
+exposes the same interface as `Chessnut.board.Board` but stores the position
+as integer bitmasks. This class is only used internally by the `Game` class,
+and is selected with `Game(backend='bitboard')`.
+"""
+
+from Chessnut import moves as move_tables
+
+
+class BitBoard(object):
+    """
+    This class manages the position of all pieces in a chess game. The
+    position is stored as twelve piece bitboards (one per piece symbol) plus
+    white, black and combined occupancy masks, so that ownership and
+    occupancy tests are integer operations, and so that the move generator
+    can find the end of a ray or the attackers of a square with a few mask
+    operations instead of probing one square at a time.
+
+    Bit `n` of every mask corresponds to index `n` of the raster-style board
+    used throughout Chessnut (i.e., 'a8'=0, 'h8'=7, 'a7'=8,...'h1'=63). A
+    mailbox list of piece symbols is kept alongside the bitboards so that
+    `get_piece()` and `get_owner()` do not have to search all twelve masks.
+    """
+
+    SYMBOLS = 'PNBRQKpnbrqk'
+
+    def __init__(self, position=' ' * 64):
+        self.pieces = dict.fromkeys(BitBoard.SYMBOLS, 0)
+        self.white = 0
+        self.black = 0
+        self.occupied = 0
+        self._squares = [' '] * 64
+        self.set_position(position)
+
+    def __str__(self):
+        """
+        Convert the piece placement bitboards to a FEN string.
+        """
+        rows = []
+        for row in range(8):
+            pos = []
+            empty = 0
+            for piece in self._squares[row * 8:row * 8 + 8]:
+                if piece == ' ':
+                    empty += 1
+                    continue
+                if empty:
+                    pos.append(str(empty))
+                    empty = 0
+                pos.append(piece)
+            if empty:
+                pos.append(str(empty))
+            rows.append(''.join(pos))
+        return '/'.join(rows)
+
+    def set_position(self, position):
+        """
+        Convert a FEN position string into piece placement bitboards.
+        """
+        self.pieces = dict.fromkeys(BitBoard.SYMBOLS, 0)
+        self.white = 0
+        self.black = 0
+        self.occupied = 0
+        self._squares = []
+        for char in position:
+            if char == '/':  # skip row separator character
+                continue
+            elif char.isdigit():
+                self._squares.extend([' '] * int(char))
+            else:
+                self._squares.append(char)
+
+        for index, piece in enumerate(self._squares):
+            if piece != ' ':
+                self._add(index, piece)
+
+    def _add(self, index, piece):
+        """Set the bit for `piece` at `index` in every relevant mask."""
+        bit = 1 << index
+        self.pieces[piece] |= bit
+        self.occupied |= bit
+        if piece < 'a':
+            self.white |= bit
+        else:
+            self.black |= bit
+        self._squares[index] = piece
+
+    def _clear(self, index):
+        """Clear the bit at `index` in every mask."""
+        piece = self._squares[index]
+        if piece == ' ':
+            return
+        # the bit is known to be set, so toggling it clears it
+        bit = 1 << index
+        self.pieces[piece] ^= bit
+        self.occupied ^= bit
+        if piece < 'a':
+            self.white ^= bit
+        else:
+            self.black ^= bit
+        self._squares[index] = ' '
+
+    def get_piece(self, index):
+        """Get the piece at the given index in the position array."""
+        return self._squares[index]
+
+    def get_owner(self, index):
+        """
+        Get the owner of the piece at the given index in the position array.
+        """
+        piece = self._squares[index]
+        if piece == ' ':
+            return None
+        return 'w' if piece < 'a' else 'b'
+
+    def set_piece(self, index, piece):
+        """
+        Place a piece at the given index, replacing whatever was there; a
+        blank (' ') piece empties the square.
+        """
+        self._clear(index)
+        if piece != ' ':
+            self._add(index, piece)
+
+    def move_piece(self, start, end, piece):
+        """
+        Move a piece by removing it from the starting position and adding it
+        to the end position. If a different piece is provided, that piece will
+        be placed at the end index instead.
+        """
+        self._clear(end)
+        if start == end:
+            return
+        squares = self._squares
+        moved = squares[start]
+        if moved == piece and piece != ' ':
+            # the common case: toggle both squares of the piece's masks
+            bits = 1 << start | 1 << end
+            self.pieces[piece] ^= bits
+            self.occupied ^= bits
+            if piece < 'a':
+                self.white ^= bits
+            else:
+                self.black ^= bits
+            squares[start] = ' '
+            squares[end] = piece
+            return
+        self._clear(start)
+        if piece != ' ':
+            self._add(end, piece)
+
+    def find_piece(self, symbol):
+        """
+        Find the index of the specified piece on the board, returns -1 if the
+        piece is not on the board.
+        """
+        mask = self.pieces.get(symbol, 0)
+        return (mask & -mask).bit_length() - 1
+
+    def squares(self, player):
+        """
+        Return the indices of the pieces owned by `player`, in increasing
+        order.
+        """
+        mask = self.white if player == 'w' else self.black
+        squares = []
+        while mask:
+            idx = mask.bit_length() - 1
+            squares.append(idx)
+            mask ^= 1 << idx
+        squares.reverse()
+        return squares
+
+    def blocker(self, start, ray):
+        """
+        Return the index of the first occupied square on `ray` (a ray from
+        `start` in `Chessnut.moves`), or -1 if every square on it is empty.
+        """
+        blockers = move_tables.RAY_MASKS[start][ray[0]] & self.occupied
+        if not blockers:
+            return -1
+        if ray[0] > start:
+            return (blockers & -blockers).bit_length() - 1
+        return blockers.bit_length() - 1
+
+    def attacked(self, index, player, ignore=-1):
+        """
+        Return True if the square at `index` is attacked by any piece owned
+        by `player`. The square at `ignore` is treated as empty.
+        """
+        pieces = self.pieces
+        if player == 'w':
+            pawn, knight, bishop, rook, queen, king = 'PNBRQK'
+            pawn_masks = move_tables.PAWN_MASKS['b']
+        else:
+            pawn, knight, bishop, rook, queen, king = 'pnbrqk'
+            pawn_masks = move_tables.PAWN_MASKS['w']
+
+        if (move_tables.KNIGHT_MASKS[index] & pieces[knight] or
+                pawn_masks[index] & pieces[pawn] or
+                move_tables.KING_MASKS[index] & pieces[king]):
+            return True
+
+        # a ray attacks the square if its nearest occupied square holds a
+        # slider that moves along it
+        diagonal_sliders = pieces[bishop] | pieces[queen]
+        straight_sliders = pieces[rook] | pieces[queen]
+        occupied = self.occupied
+        if ignore >= 0:
+            occupied &= ~(1 << ignore)
+        for mask, ascending, diagonal in move_tables.SLIDE_MASKS[index]:
+            sliders = diagonal_sliders if diagonal else straight_sliders
+            blockers = mask & occupied
+            if not blockers & sliders:
+                continue
+            if ascending:
+                nearest = blockers & -blockers
+            else:
+                nearest = 1 << (blockers.bit_length() - 1)
+            if nearest & sliders:
+                return True
+
+        return False
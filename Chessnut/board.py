@@ -4,6 +4,8 @@ Forsyth-Edwards Notation (FEN). This class is only used internally by the
 `Game` class.
 """
 
+from Chessnut import moves as move_tables
+
 
 class Board(object):
     """
@@ -62,6 +64,13 @@ class Board(object):
             return 'w' if piece.isupper() else 'b'
         return None
 
+    def set_piece(self, index, piece):
+        """
+        Place a piece at the given index, replacing whatever was there; a
+        blank (' ') piece empties the square.
+        """
+        self._position[index] = piece
+
     def move_piece(self, start, end, piece):
         """
         Move a piece by removing it from the starting position and adding it
@@ -77,3 +86,62 @@ class Board(object):
         piece is not on the board.
         """
         return ''.join(self._position).find(symbol)
+
+    def squares(self, player):
+        """
+        Return the indices of the pieces owned by `player`, in increasing
+        order.
+        """
+        if player == 'w':
+            return [idx for idx, piece in enumerate(self._position)
+                    if piece != ' ' and piece.isupper()]
+        return [idx for idx, piece in enumerate(self._position)
+                if piece != ' ' and piece.islower()]
+
+    def blocker(self, start, ray):
+        """
+        Return the index of the first occupied square on `ray` (a ray from
+        `start` in `Chessnut.moves`), or -1 if every square on it is empty.
+        """
+        position = self._position
+        for idx in ray:
+            if position[idx] != ' ':
+                return idx
+        return -1
+
+    def attacked(self, index, player, ignore=-1):
+        """
+        Return True if the square at `index` is attacked by any piece owned
+        by `player`. The square at `ignore` is treated as empty.
+        """
+        position = self._position
+        if player == 'w':
+            pawn, knight, bishop, rook, queen, king = 'PNBRQK'
+            pawn_attacks = move_tables.PAWN_ATTACKS['b']
+        else:
+            pawn, knight, bishop, rook, queen, king = 'pnbrqk'
+            pawn_attacks = move_tables.PAWN_ATTACKS['w']
+
+        for idx in move_tables.KNIGHT_ATTACKS[index]:
+            if position[idx] == knight:
+                return True
+        for idx in pawn_attacks[index]:
+            if position[idx] == pawn:
+                return True
+        for idx in move_tables.KING_ATTACKS[index]:
+            if position[idx] == king:
+                return True
+
+        for ray, diagonal in move_tables.SLIDES[index]:
+            slider = bishop if diagonal else rook
+            for idx in ray:
+                if idx == ignore:
+                    continue
+                piece = position[idx]
+                if piece == ' ':
+                    continue
+                if piece == slider or piece == queen:
+                    return True
+                break
+
+        return False
@@ -0,0 +1,47 @@
+"""
+Compact 16-bit integer encoding of chess moves, used internally by the move
+generator and by `Game.push()`/`Game.pop()` so that moves do not have to be
+built and parsed as strings at every node of a search.
+
+The bits of an encoded move are laid out as:
+
+    bits  0-5   starting index (raster order, 'a8'=0 ... 'h1'=63)
+    bits  6-11  ending index
+    bits 12-13  promotion piece, an index into PROMOTIONS ('nbrq')
+    bits 14-15  flag: NORMAL, PROMOTION, EN_PASSANT or CASTLING
+
+so every move fits in an unsigned short, and lists of moves pack into
+`array('H')`. Moves are converted to simple algebraic notation (e.g.,
+'e2e4', 'g7h8q') only at the `Game` API boundary.
+"""
+
+NORMAL = 0
+PROMOTION = 1
+EN_PASSANT = 2
+CASTLING = 3
+
+PROMOTIONS = 'nbrq'
+
+# Algebraic names of the board indices, e.g., SQUARES[0] == 'a8'
+SQUARES = [chr(97 + idx % 8) + str(8 - idx // 8) for idx in range(64)]
+
+
+def encode(start, end, flag=NORMAL, promotion=0):
+    """
+    Pack a move into a 16-bit integer. `promotion` is an index into
+    PROMOTIONS and is only meaningful with the PROMOTION flag.
+    """
+    return start | end << 6 | promotion << 12 | flag << 14
+
+
+def decode(move):
+    """Unpack a move into a `(start, end, flag, promotion)` tuple."""
+    return move & 63, move >> 6 & 63, move >> 14, move >> 12 & 3
+
+
+def to_str(move):
+    """Convert an encoded move to simple algebraic notation."""
+    res = SQUARES[move & 63] + SQUARES[move >> 6 & 63]
+    if move >> 14 == PROMOTION:
+        res += PROMOTIONS[move >> 12 & 3]
+    return res
@@ -12,14 +12,41 @@ handle any chess variants (e.g., Chess960) that are not equivalent to standard
 chess rules.
 """
 
-from collections import namedtuple
+from array import array
+from collections import namedtuple, OrderedDict
 
+from Chessnut.bitboard import BitBoard
 from Chessnut.board import Board
-from Chessnut.moves import MOVES
+from Chessnut.encoding import (PROMOTION, EN_PASSANT, CASTLING, PROMOTIONS,
+                               SQUARES, encode, to_str)
+from Chessnut import moves as move_tables
+from Chessnut.zobrist import (PIECE_KEYS, PLAYER_KEY, CASTLING_KEYS,
+                              EN_PASSANT_KEYS, hash_position)
 
 # Define a named tuple with FEN field names to hold game state information
 State = namedtuple('State', ['player', 'rights', 'en_passant', 'ply', 'turn'])
 
+# Board backends that can be selected when constructing a `Game`; both expose
+# the same interface (get_piece, get_owner, find_piece, move_piece, and FEN
+# conversion through set_position/__str__), and the queries that the move
+# generator uses to find pieces, ray ends and attacks (squares, blocker and
+# attacked), which the bitboard backend answers with mask operations
+BACKENDS = {'list': Board, 'bitboard': BitBoard}
+
+# Castling rights that *might* be voided by a move from or to each square,
+# the right used by a king move to each castling square, and the rook move
+# that accompanies castling to that square
+RIGHTS_MAP = {0: 'q', 4: 'kq', 7: 'k', 56: 'Q', 60: 'KQ', 63: 'K'}
+CASTLE_RIGHTS = {62: 'K', 58: 'Q', 6: 'k', 2: 'q'}
+CASTLE_ROOKS = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+
+# Promotion pieces are listed in the order bishop, knight, rook, queen
+PROMOTION_ORDER = [PROMOTIONS.index(p) for p in 'bnrq']
+
+# History modes: 'fen' records a FEN string in `fen_history` for every
+# position, 'compact' records only the 64-bit Zobrist keys in `key_history`
+HISTORY_MODES = ('fen', 'compact')
+
 
 class InvalidMove(Exception):
     """
@@ -35,6 +62,10 @@ class Game(object):
     representation of the position of each piece on the board in an instance
     of the `Board` class, and the additional state information in an instance
     of the `State` namedtuple class.
+
+    The 64-bit Zobrist hash of the current position is available as
+    `game.hash`, and is updated incrementally as moves are made and taken
+    back.
     """
 
     NORMAL = 0
@@ -44,16 +75,38 @@ class Game(object):
 
     default_fen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
 
-    def __init__(self, fen=default_fen, validate=True):
+    def __init__(self, fen=default_fen, validate=True, backend='list',
+                 cache_size=1024, history='fen'):
         """
         Initialize the game board to the supplied FEN state (or the default
         starting state if none is supplied), and determine whether to check
-        the validity of moves returned by `get_moves()`.
+        the validity of moves returned by `get_moves()`. The `backend` selects
+        the board representation: 'list' (a list of 64 piece symbols) or
+        'bitboard' (piece bitboards plus occupancy masks). The legal moves,
+        check flag, and status of the `cache_size` most recently queried
+        positions are kept in an LRU cache; 0 disables the cache.
+
+        The Zobrist key of every position reached is recorded in
+        `key_history`, and moves made with `apply_move()` keep no undo
+        record; with `history='compact'` the FEN strings are not recorded in
+        `fen_history` either, so long games only keep about 10 bytes per move
+        (its key and its 16-bit code).
         """
-        self.board = Board()
+        if backend not in BACKENDS:
+            raise ValueError("Unknown board backend: {}".format(backend))
+        if history not in HISTORY_MODES:
+            raise ValueError("Unknown history mode: {}".format(history))
+        self.history = history
+        self.backend = backend
+        self.board = BACKENDS[backend]()
         self.state = State(' ', ' ', ' ', ' ', ' ')
-        self.move_history = []
+        self.hash = 0
+        self._move_codes = array('H')
         self.fen_history = []
+        self.key_history = array('Q')
+        self._undo = []
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
         self.validate = validate
         self.set_fen(fen=fen)
 
@@ -85,21 +138,28 @@ class Game(object):
         """
         Parse a FEN string into components and store in the `board` and `state`
         properties, and append the FEN string to the game history *without*
-        clearing it first.
+        clearing it first. Moves applied before the new position cannot be
+        taken back with `pop()`, and `key_history` restarts from the new
+        position, so that positions of the previous game are not counted as
+        repetitions.
         """
-        self.fen_history.append(fen)
+        if self.history == 'fen':
+            self.fen_history.append(fen)
+        self._undo = []
         fields = fen.split(' ')
         fields[4] = int(fields[4])
         fields[5] = int(fields[5])
         self.state = State(*fields[1:])
         self.board.set_position(fields[0])
+        self.hash = hash_position(self.board, self.state)
+        self.key_history = array('Q', [self.hash])
 
     def reset(self, fen=default_fen):
         """
         Clear the game history and set the board to the default starting
         position.
         """
-        self.move_history = []
+        self._move_codes = array('H')
         self.fen_history = []
         self.set_fen(fen)
 
@@ -123,141 +183,504 @@ class Game(object):
         Update the state information (player, castling rights, en passant
         target, ply, and turn), apply the move to the game board, and
         update the game history.
+
+        The move is committed: no undo record is kept for it, so it (and any
+        move before it, including moves made with `push()`) cannot be taken
+        back with `pop()`. Use `push()` for moves that will be taken back.
         """
+        self.push(move)
+        if self.history == 'fen':
+            self.fen_history.append(self.get_fen())
+        self._undo = []
 
-        # declare the status fields using default parameters
-        fields = ['w', 'KQkq', '-', 0, 1]
-        # move = self._translate(move)
+    def push(self, move, validate=True):
+        """
+        Apply a move to the board and state in place, without producing a
+        FEN string. The move may be given in simple algebraic notation or as
+        an integer from `Chessnut.encoding` (e.g., from
+        `get_moves(as_int=True)`). Everything needed to reverse the move (the
+        captured piece, the previous state, and any rook or en passant pawn
+        that was moved) is kept on an undo stack for `pop()`.
+
+        Callers that take the move from `get_moves()` or `get_captures()` of
+        the current position can pass `validate=False` to skip generating
+        the legal moves again to check it.
+        """
+        if isinstance(move, int):
+            code = move
+        else:
+            code = self._parse_move(move)
 
-        # gracefully handle empty or incomplete moves
-        if move is None or move == '' or len(move) < 4:
+        if validate and self.validate and \
+                code not in self._position_info()[0]:
             raise InvalidMove("\nIllegal move: {}\nfen: {}".format(move,
                                                                    str(self)))
 
-        # convert to lower case to avoid casing issues
-        move = move.lower()
-
-        start = Game.xy2i(move[:2])
-        end = Game.xy2i(move[2:4])
+        start = code & 63
+        end = code >> 6 & 63
+        flag = code >> 14
         piece = self.board.get_piece(start)
         target = self.board.get_piece(end)
+        state = self.state
 
-        if self.validate and move not in self.get_moves(idx_list=[start]):
-            raise InvalidMove("\nIllegal move: {}\nfen: {}".format(move,
-                                                                   str(self)))
+        # declare the status fields using default parameters
+        fields = ['w', 'KQkq', '-', 0, 1]
 
         # toggle the active player
-        fields[0] = {'w': 'b', 'b': 'w'}[self.state.player]
+        fields[0] = {'w': 'b', 'b': 'w'}[state.player]
 
         # modify castling rights - the set of castling rights that *might*
         # be voided by a move is uniquely determined by the starting index
         # of the move - regardless of what piece moves from that position
         # (excluding chess variants like chess960).
-        rights_map = {0: 'q', 4: 'kq', 7: 'k',
-                      56: 'Q', 60: 'KQ', 63: 'K'}
-        void_set = ''.join([rights_map.get(start, ''),
-                           rights_map.get(end, '')])
-        new_rights = [r for r in self.state.rights if r not in void_set]
-        fields[1] = ''.join(new_rights) or '-'
+        rights = state.rights
+        if start in RIGHTS_MAP or end in RIGHTS_MAP:
+            void_set = RIGHTS_MAP.get(start, '') + RIGHTS_MAP.get(end, '')
+            rights = ''.join([r for r in rights if r not in void_set]) or '-'
+        fields[1] = rights
 
         # set en passant target square when a pawn advances two spaces
-        if piece.lower() == 'p' and abs(start - end) == 16:
-            fields[2] = Game.i2xy((start + end) // 2)
+        is_pawn = piece == 'P' or piece == 'p'
+        if is_pawn and abs(start - end) == 16:
+            fields[2] = SQUARES[(start + end) // 2]
 
         # reset the half move counter when a pawn moves or is captured
-        fields[3] = self.state.ply + 1
-        if piece.lower() == 'p' or target.lower() != ' ':
+        fields[3] = state.ply + 1
+        if is_pawn or target != ' ':
             fields[3] = 0
 
         # Increment the turn counter when the next move is from white, i.e.,
         # the current player is black
-        fields[4] = self.state.turn
-        if self.state.player == 'b':
-            fields[4] = self.state.turn + 1
+        fields[4] = state.turn
+        if state.player == 'b':
+            fields[4] = state.turn + 1
 
         # check for pawn promotion
-        if len(move) == 5:
-            piece = move[4]
-            if self.state.player == 'w':
-                piece = piece.upper()
-
-        # record the move in the game history and apply it to the board
-        self.move_history.append(move)
-        self.board.move_piece(start, end, piece)
+        new_piece = piece
+        if flag == PROMOTION:
+            new_piece = PROMOTIONS[code >> 12 & 3]
+            if state.player == 'w':
+                new_piece = new_piece.upper()
+
+        # apply the move to the board, and XOR the pieces that changed in
+        # and out of the position hash
+        self.board.move_piece(start, end, new_piece)
+        key = self.hash ^ PLAYER_KEY
+        if piece != ' ':
+            key ^= PIECE_KEYS[piece][start] ^ PIECE_KEYS[new_piece][end]
+        if target != ' ':
+            key ^= PIECE_KEYS[target][end]
 
         # move the rook to the other side of the king in case of castling
-        c_type = {62: 'K', 58: 'Q', 6: 'k', 2: 'q'}.get(end, None)
-        if piece.lower() == 'k' and c_type and c_type in self.state.rights:
-            coords = {'K': (63, 61), 'Q': (56, 59),
-                      'k': (7, 5), 'q': (0, 3)}[c_type]
-            r_piece = self.board.get_piece(coords[0])
-            self.board.move_piece(coords[0], coords[1], r_piece)
+        rook = None
+        if flag == CASTLING:
+            r_start, r_end = CASTLE_ROOKS[end]
+            r_piece = self.board.get_piece(r_start)
+            self.board.move_piece(r_start, r_end, r_piece)
+            rook = (r_start, r_end, r_piece)
+            if r_piece != ' ':
+                key ^= PIECE_KEYS[r_piece][r_start] ^ PIECE_KEYS[r_piece][r_end]
 
         # in en passant remove the piece that is captured
-        if piece.lower() == 'p' and self.state.en_passant != '-' \
-                and Game.xy2i(self.state.en_passant) == end:
-            ep_tgt = Game.xy2i(self.state.en_passant)
-            if ep_tgt < 24:
-                self.board.move_piece(end + 8, end + 8, ' ')
-            elif ep_tgt > 32:
-                self.board.move_piece(end - 8, end - 8, ' ')
+        passed = None
+        if flag == EN_PASSANT:
+            cap_idx = end + 8 if end < 24 else end - 8
+            passed = (cap_idx, self.board.get_piece(cap_idx))
+            self.board.move_piece(cap_idx, cap_idx, ' ')
+            if passed[1] != ' ':
+                key ^= PIECE_KEYS[passed[1]][cap_idx]
+
+        # update the hash for the castling rights and en passant file
+        if rights != state.rights:
+            for right in state.rights:
+                if right not in rights:
+                    key ^= CASTLING_KEYS.get(right, 0)
+        if state.en_passant != '-':
+            key ^= EN_PASSANT_KEYS[ord(state.en_passant[0]) - 97]
+        if fields[2] != '-':
+            key ^= EN_PASSANT_KEYS[ord(fields[2][0]) - 97]
 
         # state update must happen after castling
-        self.set_fen(' '.join(str(x) for x in [self.board] + list(fields)))
+        self.state = State(*fields)
+        self._undo.append((move, start, end, piece, target, state, rook,
+                           passed, len(self.fen_history), self.hash))
+        self.hash = key
+        self.key_history.append(key)
+        self._move_codes.append(code)
+
+    def _parse_move(self, move):
+        """
+        Convert a move in simple algebraic notation to its integer encoding,
+        using the current position to set the castling and en passant flags.
+        """
+        # move = self._translate(move)
 
-    def get_moves(self, player=None, idx_list=range(64)):
+        # gracefully handle empty or incomplete moves
+        if move is None or move == '' or len(move) < 4:
+            raise InvalidMove("\nIllegal move: {}\nfen: {}".format(move,
+                                                                   str(self)))
+
+        # convert to lower case to avoid casing issues
+        move = move.lower()
+
+        try:
+            start = SQUARES.index(move[:2])
+            end = SQUARES.index(move[2:4])
+            promotion = PROMOTIONS.index(move[4]) if len(move) == 5 else -1
+        except ValueError:
+            raise InvalidMove("\nIllegal move: {}\nfen: {}".format(move,
+                                                                   str(self)))
+
+        piece = self.board.get_piece(start).lower()
+        if promotion >= 0:
+            return encode(start, end, PROMOTION, promotion)
+        if piece == 'k' and abs(start - end) == 2 and \
+                CASTLE_RIGHTS.get(end, ' ') in self.state.rights:
+            return encode(start, end, CASTLING)
+        if piece == 'p' and self.state.en_passant == SQUARES[end]:
+            return encode(start, end, EN_PASSANT)
+        return encode(start, end)
+
+    def pop(self):
+        """
+        Take back the last move applied with `push()`, restoring the board,
+        the state, and the game history, and return the move that was removed
+        (in the form it was given to `push()`). Raise `IndexError` if there
+        is no such move, e.g., because `apply_move()` or `set_fen()` committed
+        the position since.
+        """
+        if not self._undo:
+            raise IndexError("No move to take back: moves made with "
+                             "apply_move() cannot be popped")
+        (move, start, end, piece, target, state, rook,
+         passed, fen_len, key) = self._undo.pop()
+
+        self.board.move_piece(end, start, piece)
+        self.board.set_piece(end, target)
+        if rook:
+            self.board.move_piece(rook[1], rook[0], rook[2])
+        if passed:
+            self.board.set_piece(passed[0], passed[1])
+
+        self.state = state
+        self.hash = key
+        self.key_history.pop()
+        self._move_codes.pop()
+        del self.fen_history[fen_len:]
+        return move
+
+    def push_null(self):
+        """
+        Pass the turn to the other player without moving a piece (a "null
+        move"), as used by null move pruning in a search. The en passant
+        target is cleared, and the half move counter restarts so that
+        repetitions are not looked for across the null move. The null move
+        is not added to `move_history`, and must be taken back with
+        `pop_null()` before any earlier move is taken back with `pop()`.
+        """
+        state = self.state
+        key = self.hash ^ PLAYER_KEY
+        if state.en_passant != '-':
+            key ^= EN_PASSANT_KEYS[ord(state.en_passant[0]) - 97]
+
+        turn = state.turn + 1 if state.player == 'b' else state.turn
+        self.state = State({'w': 'b', 'b': 'w'}[state.player], state.rights,
+                           '-', 0, turn)
+        self._undo.append((state, self.hash))
+        self.hash = key
+        self.key_history.append(key)
+
+    def pop_null(self):
+        """Take back the null move made with `push_null()`."""
+        self.state, self.hash = self._undo.pop()
+        self.key_history.pop()
+
+    @property
+    def move_history(self):
+        """
+        List of the moves applied since the last `reset()`, in simple
+        algebraic notation.
+        """
+        return [to_str(code) for code in self._move_codes]
+
+    def get_moves(self, player=None, idx_list=range(64), as_int=False):
         """
         Get a list containing the legal moves for pieces owned by the
         specified player that are located at positions included in the
         idx_list. By default, it compiles the list for the active player
         (i.e., self.state.player) by filtering the list of _all_moves() to
         eliminate any that would expose the player's king to check.
+
+        Moves are returned in simple algebraic notation, or as integers
+        from `Chessnut.encoding` if `as_int` is True. The legal moves of the
+        active player are looked up in the position cache, so repeated
+        queries in one position are only generated once.
         """
         if not self.validate:
-            return self._all_moves(player=player, idx_list=idx_list)
+            moves = list(self._gen_moves(player or self.state.player,
+                                         idx_list))
+        elif player and player != self.state.player:
+            moves = self._legal_moves(player, idx_list)[0]
+        elif idx_list == range(64):
+            entry = self._position_info()
+            if as_int:
+                return list(entry[0])
+            if entry[3] is None:
+                entry[3] = [to_str(m) for m in entry[0]]
+            return list(entry[3])
+        else:
+            # keep the order that generating from idx_list would have
+            # produced
+            order = {idx: n for n, idx in enumerate(idx_list)}
+            moves = sorted((m for m in self._position_info()[0]
+                            if m & 63 in order),
+                           key=lambda m: order[m & 63])
+
+        if as_int:
+            return moves
+        return [to_str(m) for m in moves]
+
+    def iter_moves(self, player=None, idx_list=range(64), as_int=False):
+        """
+        Generate the legal moves for pieces owned by the specified player
+        that are located at positions included in the idx_list one at a
+        time, in the same order as `get_moves()`, so that callers which stop
+        early do not pay for validating the rest of the list.
+
+        The position may be changed between moves (e.g., with `push()`), as
+        long as it is restored (e.g., with `pop()`) before the next move is
+        requested.
+        """
+        player = player or self.state.player
+        if not self.validate:
+            moves = self._gen_moves(player, idx_list)
+        else:
+            entry = None
+            if player == self.state.player and idx_list == range(64):
+                entry = self._cache.get(self.hash)
+            if entry is not None:
+                moves = iter(entry[0])
+            else:
+                moves = self._iter_legal(player, idx_list)[0]
+
+        for move in moves:
+            yield move if as_int else to_str(move)
+
+    def get_captures(self, player=None, as_int=False):
+        """
+        Get a list containing the legal captures (including en passant) and
+        pawn promotions of the specified player, or of the active player by
+        default. The moves are generated directly from the pieces that can
+        capture, instead of by filtering the full list of legal moves, so
+        that a search can extend its leaves through the exchanges cheaply.
+        """
+        player = player or self.state.player
+        moves = self._gen_captures(player)
+        if self.validate:
+            k_idx = self.board.find_piece({'w': 'K', 'b': 'k'}[player])
+            if k_idx >= 0:
+                checks, pins = self._checks_and_pins(k_idx, player)
+                moves = self._filter_legal(moves, player, k_idx, checks,
+                                           pins)
+
+        if as_int:
+            return list(moves)
+        return [to_str(m) for m in moves]
+
+    def has_legal_move(self):
+        """
+        Return True if the active player has at least one legal move,
+        stopping at the first one found.
+        """
+        entry = self._cache.get(self.hash)
+        if entry is not None:
+            return bool(entry[0])
+        moves = self._iter_legal(self.state.player, range(64))[0]
+        return next(moves, None) is not None
+
+    def in_check(self):
+        """Return True if the active player's king is in check."""
+        entry = self._cache.get(self.hash)
+        if entry is not None:
+            return entry[1]
+        # test the king's square directly instead of generating the moves
+        player = self.state.player
+        k_idx = self.board.find_piece('K' if player == 'w' else 'k')
+        return k_idx >= 0 and \
+            self._attacked(k_idx, 'b' if player == 'w' else 'w')
+
+    def _position_info(self):
+        """
+        Return the cached `[moves, check, status, move_strings]` entry for
+        the current position (keyed by its Zobrist hash), generating it on a
+        miss and evicting the least recently used entry once the cache holds
+        `cache_size` positions. Moves are stored as integers; their string
+        forms are filled in the first time they are requested.
+        """
+        key = self.hash
+        cache = self._cache
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+            return entry
+
+        moves, checks = self._legal_moves(self.state.player, range(64))
+        entry = [moves, bool(checks), Game._status(checks, moves), None]
+
+        if self.cache_size > 0:
+            cache[key] = entry
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return entry
+
+    def _legal_moves(self, player, idx_list):
+        """
+        Return the legal moves for `player` from the squares in idx_list as
+        a list of encoded integers, along with the list of checks against
+        that player's king.
+        """
+        moves, checks = self._iter_legal(player, idx_list)
+        return list(moves), checks
 
-        if not player:
-            player = self.state.player
+    def _iter_legal(self, player, idx_list):
+        """
+        Return a generator over the legal moves for `player` from the
+        squares in idx_list as encoded integers, along with the list of
+        checks against that player's king.
+
+        The pieces giving check, the pinned pieces, and the lines they are
+        pinned along are computed once for the position, so each candidate
+        move is tested against those instead of against the opponent's
+        reply moves.
+        """
+        k_idx = self.board.find_piece({'w': 'K', 'b': 'k'}[player])
+        if k_idx < 0:
+            return self._gen_moves(player, idx_list), []
+        checks, pins = self._checks_and_pins(k_idx, player)
+        return self._filter_legal(self._gen_moves(player, idx_list), player,
+                                  k_idx, checks, pins), checks
+
+    def _filter_legal(self, moves, player, k_idx, checks, pins):
+        """
+        Generate the reachable `moves` of `player` that do not leave the
+        king at `k_idx` in check, given the checks and pins found for the
+        position.
+        """
+        opp = {'w': 'b', 'b': 'w'}[player]
+
+        for move in moves:
+            start = move & 63
+            end = move >> 6 & 63
+
+            if start == k_idx:
+                if move >> 14 == CASTLING:
+                    # Don't allow castling out of, through, or into check
+                    if (checks or self._attacked((start + end) // 2, opp) or
+                            self._attacked(end, opp)):
+                        continue
+                elif self._attacked(end, opp, ignore=k_idx):
+                    # the king's own square is ignored so that it cannot
+                    # retreat along the line of a checking piece
+                    continue
 
-        res_moves = []
+            elif len(checks) > 1:
+                # only the king can move out of a double check
+                continue
 
-        # This is the most inefficient part of the model - there is no cache
-        # for previously computed move lists, so creating a new test board
-        # each time and applying the moves incurs high overhead, and throws
-        # away the result at the end of each pass through the loop
-        test_board = Game(fen=str(self), validate=False)
-        for move in self._all_moves(player=player, idx_list=idx_list):
+            elif move >> 14 == EN_PASSANT:
+                # en passant removes two pieces from the same rank, which
+                # can expose the king in ways a pin cannot describe
+                if self._exposed_by_en_passant(start, end, k_idx, opp):
+                    continue
 
-            test_board.reset(fen=str(self))
+            elif start in pins and end not in pins[start]:
+                continue
 
-            # Don't allow castling out of or through the king in check
-            k_sym, opp = {'w': ('K', 'b'), 'b': ('k', 'w')}.get(player)
-            kdx = self.board.find_piece(k_sym)
-            k_loc = Game.i2xy(kdx)
-            dx = abs(kdx - Game.xy2i(move[2:4]))
+            elif checks and end not in checks[0]:
+                continue
 
-            if move[0:2] == k_loc and dx == 2:
+            yield move
 
-                op_moves = set([m[2:4] for m in test_board.get_moves(player=opp)])
-                castle_gap = {'e1g1': 'e1f1', 'e1c1': 'e1d1',
-                              'e8g8': 'e8f8', 'e8c8': 'e8d8'}.get(move, '')
+    @staticmethod
+    def _status(checks, can_move):
+        """
+        Return the game status given the checks against the active player
+        and whether that player has any legal move.
+        """
+        if checks:
+            return Game.CHECK if can_move else Game.CHECKMATE
+        return Game.NORMAL if can_move else Game.STALEMATE
 
-                # testing for castle gap in the move list depends on _all_moves()
-                # returning moves in order radiating away from each piece, so that
-                # king castling moves are always considered after verifying the king
-                # can legally move to the gap cell.
-                if (k_loc in op_moves or castle_gap and castle_gap not in res_moves):
+    def _checks_and_pins(self, k_idx, player):
+        """
+        Find the pieces giving check to the king owned by `player` at index
+        `k_idx`, and the pieces pinned against it. Returns a list with one
+        set per checking piece containing the squares that would resolve
+        that check (the checker and any squares between it and the king),
+        and a dict mapping each pinned square to the set of squares the
+        pinned piece can move to without leaving the line of the pin.
+        """
+        get_piece = self.board.get_piece
+        if player == 'w':
+            pawn, knight, bishop, rook, queen = 'pnbrq'
+        else:
+            pawn, knight, bishop, rook, queen = 'PNBRQ'
+
+        checks = []
+        pins = {}
+        for idx in move_tables.KNIGHT_ATTACKS[k_idx]:
+            if get_piece(idx) == knight:
+                checks.append({idx})
+        for idx in move_tables.PAWN_ATTACKS[player][k_idx]:
+            if get_piece(idx) == pawn:
+                checks.append({idx})
+
+        for ray, diagonal in move_tables.SLIDES[k_idx]:
+            slider = bishop if diagonal else rook
+            line = []
+            pinned = -1
+            for idx in ray:
+                line.append(idx)
+                piece = get_piece(idx)
+                if piece == ' ':
+                    continue
+                if (piece.isupper()) == (player == 'w'):
+                    if pinned >= 0:
+                        break
+                    pinned = idx
                     continue
+                if piece == slider or piece == queen:
+                    if pinned < 0:
+                        checks.append(set(line))
+                    else:
+                        pins[pinned] = set(line)
+                break
 
-            # Apply the move to the test board to ensure that the king does
-            # not end up in check
-            test_board.apply_move(move)
-            tgts = set([m[2:4] for m in test_board.get_moves()])
+        return checks, pins
 
-            if Game.i2xy(test_board.board.find_piece(k_sym)) not in tgts:
-                res_moves.append(move)
+    def _attacked(self, index, player, ignore=-1):
+        """
+        Return True if the square at `index` is attacked by any piece owned
+        by `player`. The square at `ignore` is treated as empty.
+        """
+        return self.board.attacked(index, player, ignore)
 
-        return res_moves
+    def _exposed_by_en_passant(self, start, end, k_idx, opp):
+        """
+        Return True if capturing en passant from `start` to `end` would leave
+        the king at `k_idx` attacked by `opp`.
+        """
+        cap_idx = start - start % 8 + end % 8
+        piece = self.board.get_piece(start)
+        captured = self.board.get_piece(cap_idx)
+
+        self.board.move_piece(start, end, piece)
+        self.board.set_piece(cap_idx, ' ')
+        exposed = self._attacked(k_idx, opp)
+        self.board.move_piece(end, start, piece)
+        self.board.set_piece(cap_idx, captured)
+
+        return exposed
 
     def _all_moves(self, player=None, idx_list=range(64)):
         """
@@ -268,32 +691,124 @@ class Game(object):
         self.state.player) by checking every square on the board.
         """
         player = player or self.state.player
-        res_moves = []
-        for start in idx_list:
-            if self.board.get_owner(start) != player:
-                continue
+        return [to_str(m) for m in self._gen_moves(player, idx_list)]
+
+    def _gen_moves(self, player, idx_list=range(64)):
+        """
+        Generate the encoded integer form of every reachable move for pieces
+        owned by `player` at the positions in idx_list, in the same order
+        as `_all_moves()`.
+        """
+        ep_idx = -1
+        if self.state.en_passant != '-':
+            ep_idx = SQUARES.index(self.state.en_passant)
+
+        get_owner = self.board.get_owner
+        get_piece = self.board.get_piece
+        blocker = self.board.blocker
+        opp = {'w': 'b', 'b': 'w'}[player]
 
+        starts = self.board.squares(player)
+        if idx_list != range(64):
+            owned = set(starts)
+            starts = [idx for idx in idx_list if idx in owned]
+
+        for start in starts:
             # MOVES contains the list of all possible moves for a piece of
             # the specified type on an empty chess board.
-            piece = self.board.get_piece(start)
-            rays = MOVES.get(piece, [''] * 64)
-
-            for ray in rays[start]:
-                # Trace each of the 8 (or fewer) possible directions that a
-                # piece at the given starting index could move
+            piece = get_piece(start)
+            sym = piece.lower()
+            rays = move_tables.MOVES[piece][start]
+
+            if sym == 'n':
+                for end in move_tables.KNIGHT_ATTACKS[start]:
+                    if get_owner(end) != player:
+                        yield start | end << 6
+
+            elif sym == 'b' or sym == 'r' or sym == 'q':
+                # sliding pieces move up to the first occupied square of
+                # each ray, and capture there if it holds an opponent piece
+                for ray in rays:
+                    stop = blocker(start, ray)
+                    for end in ray:
+                        if end == stop:
+                            if get_owner(end) == opp:
+                                yield start | end << 6
+                            break
+                        yield start | end << 6
+
+            else:
+                for ray in rays:
+                    # Trace each of the 8 (or fewer) possible directions
+                    # that a piece at the given starting index could move
+                    for move in self._trace_ray(start, piece, ray, player,
+                                                ep_idx):
+                        yield move
+
+    def _gen_captures(self, player):
+        """
+        Generate the encoded integer form of every reachable capture and
+        pawn promotion for pieces owned by `player`. Knights, kings and pawns
+        look up their targets in the attack tables, and sliding pieces stop
+        at the first occupied square of each ray.
+        """
+        ep_idx = -1
+        if self.state.en_passant != '-':
+            ep_idx = SQUARES.index(self.state.en_passant)
 
-                new_moves = self._trace_ray(start, piece, ray, player)
-                res_moves.extend(new_moves)
+        get_owner = self.board.get_owner
+        get_piece = self.board.get_piece
+        blocker = self.board.blocker
+        opp = {'w': 'b', 'b': 'w'}[player]
+        forward = -8 if player == 'w' else 8
+        pawn_attacks = move_tables.PAWN_ATTACKS[player]
 
-        return res_moves
+        for start in self.board.squares(player):
+            sym = get_piece(start).lower()
 
-    def _trace_ray(self, start, piece, ray, player):
+            if sym == 'p':
+                for end in pawn_attacks[start]:
+                    move = start | end << 6
+                    if end == ep_idx:
+                        yield move | EN_PASSANT << 14
+                    elif get_owner(end) != opp:
+                        continue
+                    elif end < 8 or end > 55:
+                        for code in PROMOTION_ORDER:
+                            yield move | PROMOTION << 14 | code << 12
+                    else:
+                        yield move
+                end = start + forward
+                if (end < 8 or end > 55) and not get_owner(end):
+                    for code in PROMOTION_ORDER:
+                        yield start | end << 6 | PROMOTION << 14 | code << 12
+
+            elif sym == 'n' or sym == 'k':
+                if sym == 'n':
+                    targets = move_tables.KNIGHT_ATTACKS[start]
+                else:
+                    targets = move_tables.KING_ATTACKS[start]
+                for end in targets:
+                    if get_owner(end) == opp:
+                        yield start | end << 6
+
+            else:
+                for ray, diagonal in move_tables.SLIDES[start]:
+                    if sym == 'b' and not diagonal or \
+                            sym == 'r' and diagonal:
+                        continue
+                    end = blocker(start, ray)
+                    if end >= 0 and get_owner(end) == opp:
+                        yield start | end << 6
+
+    def _trace_ray(self, start, piece, ray, player, ep_idx=-1):
         """
         Return a list of moves by filtering the supplied ray (a list of
         indices corresponding to end points that lie on a common line from
         the starting index) based on the state of the chess board (e.g.,
-        castling, capturing, en passant, etc.). Moves are in simple algebraic
-        notation, e.g., 'a2a4', 'g7h8q', etc.
+        castling, capturing, en passant, etc.). Moves are encoded as
+        integers by `Chessnut.encoding`; `ep_idx` is the index of the en
+        passant target square, or -1 if there is none.
 
         Each ray should be an element from Chessnut.MOVES, representing all
         the moves that a piece could make from the starting square on an
@@ -302,13 +817,14 @@ class Game(object):
         castling, en passant, and pawn promotion.
         """
         res_moves = []
+        get_owner = self.board.get_owner
+        sym = piece.lower()
 
         for end in ray:
 
-            sym = piece.lower()
             del_x = abs(end - start) % 8
-            move = [Game.i2xy(start) + Game.i2xy(end)]
-            tgt_owner = self.board.get_owner(end)
+            move = start | end << 6
+            tgt_owner = get_owner(end)
 
             # Abort if the current player owns the piece at the end point
             if tgt_owner == player:
@@ -316,14 +832,15 @@ class Game(object):
 
             # Test castling exception for king
             if sym == 'k' and del_x == 2:
-                gap_owner = self.board.get_owner((start + end) // 2)
-                out_owner = self.board.get_owner(end - 1)
-                rights = {62: 'K', 58: 'Q', 6: 'k', 2: 'q'}.get(end, ' ')
+                gap_owner = get_owner((start + end) // 2)
+                out_owner = get_owner(end - 1)
+                rights = CASTLE_RIGHTS.get(end, ' ')
                 if (tgt_owner or gap_owner or rights not in self.state.rights or
                         (rights.lower() == 'q' and out_owner)):
                     # Abort castling because missing castling rights
                     # or piece in the way
                     break
+                move |= CASTLING << 14
 
             if sym == 'p':
                 # Pawns cannot move forward to a non-empty square
@@ -332,15 +849,19 @@ class Game(object):
 
                 # Test en passant exception for pawn
                 elif del_x != 0 and not tgt_owner:
-                    ep_coords = self.state.en_passant
-                    if ep_coords == '-' or end != Game.xy2i(ep_coords):
+                    if end != ep_idx:
                         break
+                    move |= EN_PASSANT << 14
 
                 # Pawn promotions should list all possible promotions
                 if (end < 8 or end > 55):
-                    move = [move[0] + s for s in ['b', 'n', 'r', 'q']]
+                    res_moves.extend(move | PROMOTION << 14 | code << 12
+                                     for code in PROMOTION_ORDER)
+                    if tgt_owner:
+                        break
+                    continue
 
-            res_moves.extend(move)
+            res_moves.append(move)
 
             # break after capturing an enemy piece
             if tgt_owner:
@@ -350,19 +871,13 @@ class Game(object):
 
     @property
     def status(self):
-
-        k_sym, opp = {'w': ('K', 'b'), 'b': ('k', 'w')}.get(self.state.player)
-        k_loc = Game.i2xy(self.board.find_piece(k_sym))
-        can_move = len(self.get_moves())
-        is_exposed = [m[2:] for m in self._all_moves(player=opp)
-                      if m[2:] == k_loc]
-
-        status = Game.NORMAL
-        if is_exposed:
-            status = Game.CHECK
-            if not can_move:
-                status = Game.CHECKMATE
-        elif not can_move:
-            status = Game.STALEMATE
-
-        return status
+        """
+        Return the status of the active player: NORMAL, CHECK, CHECKMATE, or
+        STALEMATE. Unless the position is cached, move generation stops at
+        the first legal move found.
+        """
+        entry = self._cache.get(self.hash)
+        if entry is not None:
+            return entry[2]
+        moves, checks = self._iter_legal(self.state.player, range(64))
+        return Game._status(checks, next(moves, None) is not None)
@@ -39,10 +39,18 @@ searching for legal moves on a particular board because any illegal move
 (e.g., blocked position) will short-circuit testing the remainder of the ray.
 It isn't a significant computational savings, but it simplifies the logic for
 determining legal moves.
+
+Building the tables takes tens of milliseconds, so they are generated once by
+`build_moves()` and shipped in a flat binary file (moves.dat, next to this
+module), which is read the first time MOVES or one of the attack tables below
+is used. After changing the table construction, regenerate the file with:
+
+    python -m Chessnut.moves
 """
 
+import os
+from array import array
 from math import atan2
-from copy import deepcopy
 
 
 # Precalculate angles for index pairs that form legal moves - straight lines
@@ -74,58 +82,199 @@ PIECES = {'k': lambda y, dx, dy: abs(dx) <= 1 and abs(dy) <= 1,
           'P': lambda y, dx, dy: (y > 1 and abs(dx) <= 1 and dy == 1),
           }
 
-MOVES = dict()
+# Order of the piece tables in the data file, and the file's location
+SYMBOLS = 'kqnbrpPKQNBR'
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'moves.dat')
+
+# Names that are loaded on first use by the module __getattr__ below
+_LAZY = ('MOVES', 'SLIDES', 'KNIGHT_ATTACKS', 'KING_ATTACKS', 'PAWN_ATTACKS',
+         'RAY_MASKS', 'SLIDE_MASKS', 'KNIGHT_MASKS', 'KING_MASKS',
+         'PAWN_MASKS')
+
+
+def build_moves():
+    """
+    Compute the MOVES dictionary from the piece movement rules above.
+    """
+    moves = dict()
+
+    for sym, is_legal in PIECES.items():
+
+        moves[sym] = list()
+
+        for idx in range(64):
+
+            # Initialize arrays for each of the 8 possible directions that a
+            # piece could be moved; some of these will be empty and
+            # removed later
+            moves[sym].append([list() for _ in range(8)])
+
+            # Sorting the list of end points by distance from the starting
+            # point ensures that the ouptut order is properly sorted
+            for end in sorted(range(64), key=lambda x: abs(x - idx)):
+
+                # Determine the row, change in column, and change in row
+                # of the start/end point pair for move validation
+                y = 8 - idx // 8
+                dx = (end % 8) - (idx % 8)
+                dy = (8 - end // 8) - y
+
+                if idx == end or not is_legal(y, dx, dy):
+                    continue
+
+                angle = atan2(dy, dx)
+                if angle in RAYS:
+
+                    # Mod by 8 to shift the ray index of knight moves down
+                    # by 8 from the index found in DIRECTIONS; the ray index
+                    # of all other pieces will be unchanged
+                    ray_num = RAYS.index(angle) % 8
+                    moves[sym][idx][ray_num].append(end)
+
+            # Remove unused (empty) lists
+            moves[sym][idx] = [r for r in moves[sym][idx] if r]
+
+    # Create copies for the remaining pieces - the original set is only
+    # minimally covering; Pawns are already included.
+    for sym in ['K', 'Q', 'N', 'B', 'R']:
+        moves[sym] = [[list(ray) for ray in rays]
+                      for rays in moves[sym.lower()]]
+
+    # Directly add castling for kings
+    moves['k'][4][0].append(6)
+    moves['k'][4][1].append(2)
+    moves['K'][60][0].append(62)
+    moves['K'][60][4].append(58)
+
+    # Directly add double-space pawn opening moves
+    ray_idx = 0
+    for i in range(8):
+        moves['p'][8 + i][ray_idx].append(24 + i)
+        moves['P'][55 - i][ray_idx].append(39 - i)
+        ray_idx = 1
+
+    return moves
+
+
+def pack_moves(moves):
+    """
+    Flatten a MOVES dictionary into an array of bytes. For each symbol in
+    SYMBOLS and each of its 64 starting squares the array holds the number
+    of rays, then each ray as its length followed by its end indices.
+    """
+    flat = array('B')
+    for sym in SYMBOLS:
+        for rays in moves[sym]:
+            flat.append(len(rays))
+            for ray in rays:
+                flat.append(len(ray))
+                flat.extend(ray)
+    return flat
 
-for sym, is_legal in PIECES.items():
 
-    MOVES[sym] = list()
+def unpack_moves(flat):
+    """
+    Rebuild the dict-of-lists MOVES view from an array made by
+    `pack_moves()`.
+    """
+    moves = dict()
+    pos = 0
+    for sym in SYMBOLS:
+        table = moves[sym] = []
+        for _ in range(64):
+            rays = []
+            for _ in range(flat[pos]):
+                size = flat[pos + 1]
+                rays.append(list(flat[pos + 2:pos + 2 + size]))
+                pos += size + 1
+            pos += 1
+            table.append(rays)
+    if pos != len(flat):
+        raise ValueError("Malformed move table data")
+    return moves
 
-    for idx in range(64):
 
-        # Initialize arrays for each of the 8 possible directions that a
-        # piece could be moved; some of these will be empty and
-        # removed later
-        MOVES[sym].append([list() for _ in range(8)])
+def load_moves():
+    """
+    Read MOVES from the shipped data file, building it from scratch if the
+    file is missing or unreadable.
+    """
+    try:
+        with open(DATA_FILE, 'rb') as f:
+            flat = array('B', f.read())
+        return unpack_moves(flat)
+    except (OSError, IndexError, ValueError):
+        return build_moves()
 
-        # Sorting the list of end points by distance from the starting
-        # point ensures that the ouptut order is properly sorted
-        for end in sorted(range(64), key=lambda x: abs(x - idx)):
 
-            # Determine the row, change in column, and change in row
-            # of the start/end point pair for move validation
-            y = 8 - idx // 8
-            dx = (end % 8) - (idx % 8)
-            dy = (8 - end // 8) - y
+def _mask(squares):
+    """Return the bitmask with the bit of each index in `squares` set."""
+    mask = 0
+    for idx in squares:
+        mask |= 1 << idx
+    return mask
 
-            if idx == end or not is_legal(y, dx, dy):
-                continue
 
-            angle = atan2(dy, dx)
-            if angle in RAYS:
+def _attack_tables(moves):
+    """
+    Derive the attack tables used to test for check and pins without
+    generating the opponent's moves. SLIDES lists the rays a queen could
+    follow from each square, each paired with a flag that is True for
+    diagonal rays (bishop and queen) and False for straight ones (rook and
+    queen); KNIGHT_ATTACKS and KING_ATTACKS list the squares those pieces
+    reach from each square; and PAWN_ATTACKS lists the squares a pawn of
+    each color captures on from each square.
 
-                # Mod by 8 to shift the ray index of knight moves down
-                # by 8 from the index found in DIRECTIONS; the ray index of
-                # all other pieces will be unchanged
-                ray_num = RAYS.index(angle) % 8
-                MOVES[sym][idx][ray_num].append(end)
+    The same tables are also given as bitmasks for the bitboard backend:
+    RAY_MASKS maps the first square of each queen ray from a square to the
+    mask of the whole ray, SLIDE_MASKS lists `(mask, ascending, diagonal)`
+    for the rays of SLIDES (`ascending` is True when the indices along the
+    ray increase), and KNIGHT_MASKS, KING_MASKS and PAWN_MASKS hold the
+    masks of the attack lists above.
+    """
+    slides = [[(ray, ray[0] % 8 != idx % 8 and ray[0] // 8 != idx // 8)
+               for ray in moves['q'][idx]] for idx in range(64)]
+    knight_attacks = [[end for ray in moves['n'][idx] for end in ray]
+                      for idx in range(64)]
+    king_attacks = [[ray[0] for ray in moves['q'][idx]] for idx in range(64)]
+    pawn_attacks = {'w': [[idx - 8 + dx for dx in (-1, 1)
+                           if idx >= 8 and 0 <= idx % 8 + dx < 8]
+                          for idx in range(64)],
+                    'b': [[idx + 8 + dx for dx in (-1, 1)
+                           if idx < 56 and 0 <= idx % 8 + dx < 8]
+                          for idx in range(64)],
+                    }
+    ray_masks = [{ray[0]: _mask(ray) for ray in moves['q'][idx]}
+                 for idx in range(64)]
+    slide_masks = [[(_mask(ray), ray[0] > idx, diagonal)
+                    for ray, diagonal in slides[idx]] for idx in range(64)]
+    return {'SLIDES': slides, 'KNIGHT_ATTACKS': knight_attacks,
+            'KING_ATTACKS': king_attacks, 'PAWN_ATTACKS': pawn_attacks,
+            'RAY_MASKS': ray_masks, 'SLIDE_MASKS': slide_masks,
+            'KNIGHT_MASKS': [_mask(s) for s in knight_attacks],
+            'KING_MASKS': [_mask(s) for s in king_attacks],
+            'PAWN_MASKS': {color: [_mask(s) for s in table]
+                           for color, table in pawn_attacks.items()},
+            }
 
-        # Remove unused (empty) lists
-        MOVES[sym][idx] = [r for r in MOVES[sym][idx] if r]
 
-# Create references to remaining pieces - the original set is only
-# minimally covering; Pawns are already included.
-for sym in ['K', 'Q', 'N', 'B', 'R']:
-    MOVES[sym] = deepcopy(MOVES[sym.lower()])
+def __getattr__(name):
+    """
+    Load MOVES and the attack tables the first time any of them is used,
+    and store them as module globals so later lookups are direct.
+    """
+    if name not in _LAZY:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    moves = load_moves()
+    tables = _attack_tables(moves)
+    tables['MOVES'] = moves
+    globals().update(tables)
+    return tables[name]
 
-# Directly add castling for kings
-MOVES['k'][4][0].append(6)
-MOVES['k'][4][1].append(2)
-MOVES['K'][60][0].append(62)
-MOVES['K'][60][4].append(58)
 
-# Directly add double-space pawn opening moves
-IDX = 0
-for i in range(8):
-    MOVES['p'][8 + i][IDX].append(24 + i)
-    MOVES['P'][55 - i][IDX].append(39 - i)
-    IDX = 1
+if __name__ == '__main__':
+    with open(DATA_FILE, 'wb') as f:
+        pack_moves(build_moves()).tofile(f)
+    print("Wrote {}".format(DATA_FILE))
@@ -0,0 +1,154 @@
+"""
+Performance test ("perft") for the Chessnut move generator. Perft counts the
+leaf nodes of the tree of legal moves to a fixed depth, which can be checked
+against published counts for well-known positions to validate the generator,
+and timed to measure its speed.
+
+Run a single position, optionally with the per-move breakdown ("divide"):
+
+    python -m Chessnut.perft "<fen>" 3 --divide
+
+Or check the reference positions below against their known counts:
+
+    python -m Chessnut.perft --suite --depth 3
+"""
+
+import argparse
+import sys
+import time
+
+from Chessnut.game import Game, BACKENDS
+
+# Reference positions and their known node counts at depth 1, 2, 3, ...
+# (from the Chess Programming Wiki perft results page)
+POSITIONS = [
+    ('start',
+     'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete',
+     'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('en passant',
+     '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('promotion',
+     'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position 5',
+     'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('position 6',
+     'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(game, depth):
+    """
+    Count the leaf nodes of the legal move tree of `game` to `depth` plies.
+    Moves are generated as integers and made and taken back with push/pop,
+    so the game is left in its original position.
+    """
+    if depth <= 0:
+        return 1
+
+    moves = game.get_moves(as_int=True)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        game.push(move)
+        nodes += perft(game, depth - 1)
+        game.pop()
+    return nodes
+
+
+def divide(game, depth):
+    """
+    Return a list of `(move, nodes)` pairs with the perft count below each
+    legal move of the current position.
+    """
+    res = []
+    for move in game.get_moves():
+        game.push(move)
+        res.append((move, perft(game, depth - 1)))
+        game.pop()
+    return res
+
+
+def _run(fen, depth, backend, show_divide):
+    """Print the perft (or divide) result for one position and depth."""
+    game = Game(fen=fen, backend=backend)
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(game, depth)
+        for move, nodes in counts:
+            print("{}: {}".format(move, nodes))
+        nodes = sum(n for _, n in counts)
+    else:
+        nodes = perft(game, depth)
+    elapsed = time.perf_counter() - start
+
+    print("Nodes: {}".format(nodes))
+    print("Time: {:.3f} s".format(elapsed))
+    print("NPS: {:.0f}".format(nodes / elapsed if elapsed else 0))
+    return nodes
+
+
+def _run_suite(depth, backend):
+    """
+    Check every reference position up to `depth` against its known counts,
+    and return the number of mismatches.
+    """
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in POSITIONS:
+        for d, expected in enumerate(counts[:depth], 1):
+            game = Game(fen=fen, backend=backend)
+            start = time.perf_counter()
+            nodes = perft(game, d)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+
+            result = 'ok' if nodes == expected else 'FAIL'
+            failures += nodes != expected
+            print("{:<12} depth {} nodes {:>9} expected {:>9} {:<4} "
+                  "{:>8.0f} nps".format(name, d, nodes, expected, result,
+                                        nodes / elapsed if elapsed else 0))
+
+    print("Total: {} nodes in {:.3f} s ({:.0f} nps), {} failed".format(
+        total_nodes, total_time,
+        total_nodes / total_time if total_time else 0, failures))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m Chessnut.perft',
+        description='Count leaf nodes of the Chessnut legal move tree.')
+    parser.add_argument('fen', nargs='?', default=Game.default_fen,
+                        help='position to search (default: start position)')
+    parser.add_argument('depth', nargs='?', type=int, default=3,
+                        help='search depth in plies (default: 3)')
+    parser.add_argument('--divide', action='store_true',
+                        help='print the node count below each root move')
+    parser.add_argument('--suite', action='store_true',
+                        help='check the reference positions up to --depth')
+    parser.add_argument('--depth', dest='suite_depth', type=int, default=3,
+                        help='maximum depth for --suite (default: 3)')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list',
+                        help='board backend (default: list)')
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 1 if _run_suite(args.suite_depth, args.backend) else 0
+
+    _run(args.fen, args.depth, args.backend, args.divide)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Defines the random 64-bit keys used to compute Zobrist hashes of chess
+positions, and a function to compute the hash of a position from scratch.
+
+A position's hash is the XOR of one key for each piece on its square, a key
+when black is the active player, one key for each available castling right,
+and a key for the file of the en passant target square (if any). Because XOR
+is its own inverse, `Game` can update the hash after each move by XORing the
+keys of only the pieces and state fields that changed.
+
+The keys are drawn from a fixed seed so that hashes of the same position
+agree between runs and between processes.
+"""
+
+from random import Random
+
+_RANDOM = Random(0x5EED5)
+
+PIECE_KEYS = {sym: [_RANDOM.getrandbits(64) for _ in range(64)]
+              for sym in 'PNBRQKpnbrqk'}
+PLAYER_KEY = _RANDOM.getrandbits(64)
+CASTLING_KEYS = {right: _RANDOM.getrandbits(64) for right in 'KQkq'}
+EN_PASSANT_KEYS = [_RANDOM.getrandbits(64) for _ in range(8)]
+
+
+def hash_position(board, state):
+    """
+    Compute the Zobrist hash of the position described by a board (either
+    backend) and a `State` tuple.
+    """
+    key = 0
+    for idx in range(64):
+        piece = board.get_piece(idx)
+        if piece != ' ':
+            key ^= PIECE_KEYS[piece][idx]
+    if state.player == 'b':
+        key ^= PLAYER_KEY
+    for right in state.rights:
+        key ^= CASTLING_KEYS.get(right, 0)
+    if state.en_passant != '-':
+        key ^= EN_PASSANT_KEYS[ord(state.en_passant[0]) - ord('a')]
+    return key